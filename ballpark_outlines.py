@@ -1,14 +1,27 @@
-import pandas as pd
+import math
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 
-# Load stadium dimensions
-stadium_df = pd.read_csv('https://raw.githubusercontent.com/jldbc/pybaseball/master/pybaseball/data/mlbstadiums.csv').drop(columns=['Unnamed: 0'])
+from stadium_geometry import stadium_geometry, stadium_teams
 
 # Function to plot stadium dimensions
+# All segments are drawn as one LineCollection, straight from the stadium geometry arrays
 def stadium_plot(team, ax, segments=['outfield_outer','foul_lines','infield_inner','infield_outer'], linewidth=2):
-  stadium_graph_data = stadium_df.loc[stadium_df['team']==team]
+  stadium_graph_data = stadium_geometry()[team]
 
-  for segment in segments:
-    ax.plot(stadium_graph_data.loc[stadium_df['segment']==segment,'x'],
-            stadium_graph_data.loc[stadium_df['segment']==segment,'y'],
-            linewidth=linewidth, color='black', alpha=0.8)
+  ax.add_collection(LineCollection([stadium_graph_data[segment] for segment in segments if segment in stadium_graph_data],
+                                   linewidths=linewidth, colors='black', alpha=0.8))
+  ax.autoscale_view()
+
+# Small multiples of every park (or a list of teams), on shared axes
+def stadium_grid(teams=None, segments=['outfield_outer','foul_lines','infield_inner','infield_outer'], linewidth=1, ncols=6, subplot_size=2.5):
+  teams = stadium_teams() if teams is None else teams
+  nrows = math.ceil(len(teams)/ncols)
+  fig, axs = plt.subplots(nrows, ncols, figsize=(ncols*subplot_size, nrows*subplot_size), sharex=True, sharey=True, squeeze=False)
+  for ax, team in zip(axs.flat, teams):
+    stadium_plot(team, ax, segments=segments, linewidth=linewidth)
+    ax.set_title(team)
+  for ax in axs.flat:
+    ax.set_aspect('equal')
+    ax.axis('off')
+  return fig
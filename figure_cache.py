@@ -0,0 +1,82 @@
+import hashlib
+import io
+import os
+import threading
+import urllib.request
+from collections import OrderedDict
+
+import matplotlib.pyplot as plt
+
+# Cache of rendered matplotlib figures for the Streamlit apps
+# Figures are stored as PNG bytes in a bounded in-memory LRU, backed by a
+# directory on disk so a restarted app doesn't need to redraw everything.
+# Keys should include everything the figure depends on, including a data version.
+
+FIGURE_CACHE_DIR = os.environ.get('FIGURE_CACHE_DIR','.figure_cache')
+
+def figure_png(fig, dpi=200):
+    # Same settings st.pyplot uses
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight', dpi=dpi)
+    plt.close(fig)
+    return buffer.getvalue()
+
+def write_file(path, data):
+    # Write to a temp file and swap it in, so readers never see a partial file
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+class FigureCache:
+    def __init__(self, max_items=256, cache_dir=FIGURE_CACHE_DIR, max_files=5000):
+        self.items = OrderedDict()
+        self.max_items = max_items
+        self.cache_dir = cache_dir
+        self.max_files = max_files
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, key, render):
+        # PNG bytes for key; render() is only called (and should return a figure) on a miss
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+        with self.lock:
+            if name in self.items:
+                self.items.move_to_end(name)
+                return self.items[name]
+
+        path = os.path.join(self.cache_dir, name+'.png')
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                png = f.read()
+        else:
+            png = figure_png(render())
+            write_file(path, png)
+            self.prune_disk()
+
+        with self.lock:
+            self.items[name] = png
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+        return png
+
+    def prune_disk(self):
+        # Drop the least recently written files once the directory is over its limit
+        files = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.png')]
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[:len(files)-self.max_files]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+def cached_asset(url, cache_dir=FIGURE_CACHE_DIR):
+    # Bytes of a static asset (logos, etc.), downloaded once and kept on disk
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, 'asset_'+hashlib.sha1(url.encode()).hexdigest())
+    if not os.path.exists(path):
+        write_file(path, urllib.request.urlopen(url).read())
+    with open(path, 'rb') as f:
+        return f.read()
@@ -1,4 +1,9 @@
 import streamlit as st
+import hashlib
+import io
+import os
+import urllib.error
+import urllib.request
 import pandas as pd
 import numpy as np
 import seaborn as sns
@@ -6,15 +11,73 @@ import matplotlib.pyplot as plt
 from matplotlib.patches import FancyBboxPatch
 from matplotlib import colors
 
+from figure_cache import FigureCache
+
 st.set_page_config(page_title='Olympic Medal Counts', page_icon='🥇')
 st.title('Olympic Medal Counts')
 
+MEDAL_TABLE_URL = "https://en.wikipedia.org/wiki/2024_Summer_Olympics_medal_table"
+# Local copy of the medal table (plus the page's ETag), so the page is only re-parsed when it has changed
+MEDAL_TABLE_FILE = os.environ.get('MEDAL_TABLE_FILE','medal_table.csv')
+
+def refresh_medal_table():
+  etag_file = MEDAL_TABLE_FILE+'.etag'
+  request = urllib.request.Request(MEDAL_TABLE_URL, headers={'User-Agent':'olympic-medal-counts'})
+  if os.path.exists(MEDAL_TABLE_FILE) and os.path.exists(etag_file):
+    with open(etag_file) as f:
+      request.add_header('If-None-Match', f.read().strip())
+  try:
+    with urllib.request.urlopen(request, timeout=30) as response:
+      html = response.read().decode()
+      etag = response.headers.get('ETag')
+  except urllib.error.HTTPError as error:
+    if error.code==304: # Not modified
+      return
+    raise
+  table = pd.read_html(io.StringIO(html))[3].iloc[:-1].to_csv(index=False)
+  old_table = open(MEDAL_TABLE_FILE).read() if os.path.exists(MEDAL_TABLE_FILE) else None
+  if table!=old_table:
+    with open(MEDAL_TABLE_FILE+'.tmp','w') as f:
+      f.write(table)
+    os.replace(MEDAL_TABLE_FILE+'.tmp', MEDAL_TABLE_FILE)
+  if etag is not None:
+    with open(etag_file,'w') as f:
+      f.write(etag)
+
 @st.cache_data(ttl=10*60,show_spinner="Loading medal data")
 def load_data():
-  tables=pd.read_html("https://en.wikipedia.org/wiki/2024_Summer_Olympics_medal_table")
-  return tables[3].iloc[:-1].copy()
+  try:
+    refresh_medal_table()
+  except (urllib.error.URLError, OSError, ValueError):
+    if not os.path.exists(MEDAL_TABLE_FILE): # Keep serving the local copy if the page can't be reached
+      raise
+  with open(MEDAL_TABLE_FILE,'rb') as f:
+    table = f.read()
+  return pd.read_csv(io.BytesIO(table)), hashlib.sha1(table).hexdigest()
+
+medal_df, data_version = load_data()
+medal_df = medal_df.rename(columns={'NOC':'Country','Total':'Medals'})
+
+max_weight = 25
+weighted_columns = ['weighted_Gold','weighted_Silver','weighted_Bronze']
+
+@st.cache_resource
+def weighted_standings(data_version):
+  # Weighted gold/silver/bronze for every (gold vs silver, silver vs bronze) slider setting at once
+  # Shape (max_weight, max_weight, countries, 3), each setting normalized back to the real number of medals,
+  # plus the order of countries by weighted count for each setting
+  medals = medal_df[['Gold','Silver','Bronze']].to_numpy(dtype='float64')
+  gold_vs_silver = np.arange(1, max_weight+1, dtype='float64')[:,None]
+  silver_vs_bronze = np.arange(1, max_weight+1, dtype='float64')[None,:]
+  medal_weights = np.stack([np.ones((max_weight,max_weight)), 1/gold_vs_silver*np.ones((1,max_weight)), 1/(gold_vs_silver*silver_vs_bronze)], axis=-1)
+  weighted = medals[None,None,:,:] * medal_weights[:,:,None,:]
+  count_adjust = medals.sum() / weighted.sum(axis=(2,3))
+  weighted = weighted * count_adjust[:,:,None,None]
+  return weighted, np.argsort(-weighted.sum(axis=3), axis=2, kind='stable')
 
-medal_df = load_data().rename(columns={'NOC':'Country','Total':'Medals'})
+@st.cache_resource
+def figure_cache():
+  return FigureCache()
 
 col1, col2 = st.columns(2)
 
@@ -33,81 +96,80 @@ with col2:
       value=2
     )
 
-gold_vs_bronze_weight = gold_vs_silver_weight * silver_vs_bronze_weight
-
-medal_df['weighted_Gold'] = medal_df['Gold'].copy()
-medal_df['weighted_Silver'] = medal_df['Silver'].div(gold_vs_silver_weight)
-medal_df['weighted_Bronze'] = medal_df['Bronze'].div(gold_vs_bronze_weight)
-medal_df['Weighted Count'] = medal_df[['weighted_Gold','weighted_Silver','weighted_Bronze']].astype('float').sum(axis=1)
-count_adjust = medal_df['Medals'].sum() / medal_df['Weighted Count'].sum()
-for medal_count in ['weighted_Bronze','weighted_Silver','weighted_Gold','Weighted Count']:
-  medal_df[medal_count] = medal_df[medal_count].mul(count_adjust)
-
-
-cmap = colors.LinearSegmentedColormap.from_list('medal_colors', ['#977547','#d6d6d6','#fcb434'], N=3)
-
-fig, ax = plt.subplots(figsize=(6,5))
-medal_df.sort_values('Weighted Count',ascending=False).set_index('Country')[['weighted_Bronze','weighted_Silver','weighted_Gold']].head(5).round(2).plot(kind='bar', 
-                                                                           cmap=cmap, 
-                                                                            stacked=True,
-                                                                                                                              edgecolor='w',
-                                                                           ax=ax, linewidth=2,
-                                                                           width=0.7,
-                                                                                                                             legend=False)
-for container in ax.containers[2::3]:
-    ax.bar_label(container)
+weighted_medals, rankings = weighted_standings(data_version)
+medal_df[weighted_columns] = weighted_medals[gold_vs_silver_weight-1, silver_vs_bronze_weight-1]
+medal_df['Weighted Count'] = medal_df[weighted_columns].sum(axis=1)
+medal_df = medal_df.iloc[rankings[gold_vs_silver_weight-1, silver_vs_bronze_weight-1]]
+
+def medal_chart(medal_df, gold_vs_silver_weight, silver_vs_bronze_weight):
+  cmap = colors.LinearSegmentedColormap.from_list('medal_colors', ['#977547','#d6d6d6','#fcb434'], N=3)
+
+  fig, ax = plt.subplots(figsize=(6,5))
+  medal_df.sort_values('Weighted Count',ascending=False).set_index('Country')[['weighted_Bronze','weighted_Silver','weighted_Gold']].head(5).round(2).plot(kind='bar', 
+                                                                             cmap=cmap, 
+                                                                              stacked=True,
+                                                                                                                                edgecolor='w',
+                                                                             ax=ax, linewidth=2,
+                                                                             width=0.7,
+                                                                                                                               legend=False)
+  for container in ax.containers[2::3]:
+      ax.bar_label(container)
   
-new_patches = []
-for patch in reversed(ax.patches):
-    bb = patch.get_bbox()
-    color=patch.get_facecolor()
-    p_bbox = FancyBboxPatch((bb.xmin, bb.ymin),
-                        abs(bb.width), abs(bb.height),
-                        boxstyle="round,pad=-0.015,rounding_size=0.075",
-                        ec="none", fc=color,
-                        mutation_aspect=4
-                        )
-    patch.remove()
-    new_patches.append(p_bbox)
-for patch in new_patches:
-    ax.add_patch(patch)
+  new_patches = []
+  for patch in reversed(ax.patches):
+      bb = patch.get_bbox()
+      color=patch.get_facecolor()
+      p_bbox = FancyBboxPatch((bb.xmin, bb.ymin),
+                          abs(bb.width), abs(bb.height),
+                          boxstyle="round,pad=-0.015,rounding_size=0.075",
+                          ec="none", fc=color,
+                          mutation_aspect=4
+                          )
+      patch.remove()
+      new_patches.append(p_bbox)
+  for patch in new_patches:
+      ax.add_patch(patch)
   
-plt.xticks(rotation=0)
-
-medal_dict = {
-    'Gold':[fig.add_axes([0.165,.81,0.2,0.2], anchor='SW', zorder=2), 1, '#fcb434'],
-    'Silver':[fig.add_axes([0.375,.81,0.2,0.2], anchor='SW', zorder=2), gold_vs_silver_weight, '#d6d6d6'],
-    'Bronze':[fig.add_axes([0.6,.81,0.2,0.2], anchor='SW', zorder=2), gold_vs_silver_weight*silver_vs_bronze_weight, '#977547']
-}
-for color in medal_dict.keys():
-    medal_ax = medal_dict[color][0]
-    medals = medal_dict[color][1]
-    row_medals = (int((medals-1)**0.5)+1)
-    rows = (medals - medals%row_medals) / row_medals
-    medal_x = [x for x in range(row_medals)] * int(rows) + [x+(row_medals-(medals%row_medals))/2 for x in range(medals%row_medals)]
-    medal_y = [rows-int(y/row_medals) for y in range(len(medal_x))]
-    sns.scatterplot(x=medal_x,
-                    y=medal_y,
-                   color=medal_dict[color][2],
-                    linewidth=1/3,
-                    edgecolor='#666666',
-                   s=1000/(row_medals**2),
-                   ax=medal_ax)
-    medal_ax.set(xlim=(medal_ax.get_xlim()[0]-1.5,medal_ax.get_xlim()[1]+1.5),
-                 ylim=(medal_ax.get_ylim()[0]-1.5,medal_ax.get_ylim()[1]+1.5),)
-    medal_ax.axis('off')
-    sns.despine(left=True, bottom=True)
-ax.set(xlabel='',
-       ylim=(0,ax.get_ylim()[1]*1.05),
-      ylabel='Weighted Medals')
-fig.suptitle('Weighted Olympic Medal Leaders',fontsize=18,y=1.05)
-fig.text(0.325,0.95,'=       =',ha='left',va='top',fontsize=32)
-fig.text(0.04,0.015,'Data: Wikipedia',ha='left',va='center',fontsize=8)
-fig.text(0.5,0.015,'@Blandalytics\nolympic-medal-counts.streamlit.app',ha='center',va='center',fontsize=8)
-fig.text(0.9,0.015,'* Host Nation',ha='right',va='center',fontsize=8)
-
-sns.despine(left=True,bottom=True)
-st.pyplot(fig)
+  plt.xticks(rotation=0)
+
+  medal_dict = {
+      'Gold':[fig.add_axes([0.165,.81,0.2,0.2], anchor='SW', zorder=2), 1, '#fcb434'],
+      'Silver':[fig.add_axes([0.375,.81,0.2,0.2], anchor='SW', zorder=2), gold_vs_silver_weight, '#d6d6d6'],
+      'Bronze':[fig.add_axes([0.6,.81,0.2,0.2], anchor='SW', zorder=2), gold_vs_silver_weight*silver_vs_bronze_weight, '#977547']
+  }
+  for color in medal_dict.keys():
+      medal_ax = medal_dict[color][0]
+      medals = medal_dict[color][1]
+      row_medals = (int((medals-1)**0.5)+1)
+      rows = (medals - medals%row_medals) / row_medals
+      medal_x = [x for x in range(row_medals)] * int(rows) + [x+(row_medals-(medals%row_medals))/2 for x in range(medals%row_medals)]
+      medal_y = [rows-int(y/row_medals) for y in range(len(medal_x))]
+      sns.scatterplot(x=medal_x,
+                      y=medal_y,
+                     color=medal_dict[color][2],
+                      linewidth=1/3,
+                      edgecolor='#666666',
+                     s=1000/(row_medals**2),
+                     ax=medal_ax)
+      medal_ax.set(xlim=(medal_ax.get_xlim()[0]-1.5,medal_ax.get_xlim()[1]+1.5),
+                   ylim=(medal_ax.get_ylim()[0]-1.5,medal_ax.get_ylim()[1]+1.5),)
+      medal_ax.axis('off')
+      sns.despine(left=True, bottom=True)
+  ax.set(xlabel='',
+         ylim=(0,ax.get_ylim()[1]*1.05),
+        ylabel='Weighted Medals')
+  fig.suptitle('Weighted Olympic Medal Leaders',fontsize=18,y=1.05)
+  fig.text(0.325,0.95,'=       =',ha='left',va='top',fontsize=32)
+  fig.text(0.04,0.015,'Data: Wikipedia',ha='left',va='center',fontsize=8)
+  fig.text(0.5,0.015,'@Blandalytics\nolympic-medal-counts.streamlit.app',ha='center',va='center',fontsize=8)
+  fig.text(0.9,0.015,'* Host Nation',ha='right',va='center',fontsize=8)
+
+  sns.despine(left=True,bottom=True)
+  return fig
+
+# Only drawn the first time each slider setting is picked (per version of the medal table)
+st.image(figure_cache().get(('medal_chart',gold_vs_silver_weight,silver_vs_bronze_weight,data_version),
+                            lambda: medal_chart(medal_df, gold_vs_silver_weight, silver_vs_bronze_weight)))
 
 st.dataframe(medal_df[['Country','Weighted Count','Gold','Silver','Bronze','Medals']].sort_values('Weighted Count',ascending=False).round({'Weighted Count':2}),
              hide_index=True,
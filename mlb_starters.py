@@ -1,31 +1,95 @@
 import datetime
+import hashlib
+import io
 import os
+import pickle
+import sqlite3
+import time
 import numpy as np
 import pandas as pd
-import psycopg2
+import requests
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from pathlib import Path
 
-# Load IDs from database
 dotenv_path = Path('pitcherlist_datascience.env')
 load_dotenv(dotenv_path=dotenv_path)
 
-conn = psycopg2.connect(f"dbname='{os.environ.get('PL_DB_DATABASE')}' user='{os.environ.get('PL_DB_USER')}' host='{os.environ.get('PL_DB_HOST')}' password='{os.environ.get('PL_DB_PASSWORD')}'")
-cursor = conn.cursor()
+# Player ID maps (SportRadar ID -> MLBAM ID, batting hand & name)
+# Loaded on first use, from a local snapshot while it's fresh, otherwise from the players table
+PLAYER_MAP_SNAPSHOT = os.environ.get('PLAYER_MAP_SNAPSHOT','player_maps.pkl')
+PLAYER_MAP_TTL = int(os.environ.get('PLAYER_MAP_TTL', 24*60*60))
+# Optional "last updated" column of the players table; once the TTL is up, the maps are only re-read if it has moved
+PLAYER_MAP_WATERMARK = os.environ.get('PLAYER_MAP_WATERMARK')
 
-cursor.execute("Select * FROM players")
-colnames = [desc[0] for desc in cursor.description]
-data = cursor.fetchall()
+player_columns = ['sportradar_player_id','mlb_player_id','batting_hand','full_name']
+player_maps_cache = {}
 
-id_data = pd.DataFrame(data).copy()
-id_data.columns = colnames
+# Column names can't be bound as query parameters, so only these may be put into the players queries
+allowed_player_columns = set(player_columns) | {'updated_at','last_updated','modified_at','last_modified'}
 
-cursor.close()
-conn.close()
+def checked_columns(columns):
+    not_allowed = [column for column in columns if column not in allowed_player_columns]
+    if len(not_allowed) > 0:
+        raise ValueError(f"Not an allowed players column: {', '.join(map(str, not_allowed))}")
+    return columns
 
-id_map = id_data[['mlb_player_id','sportradar_player_id']].set_index('sportradar_player_id').to_dict()['mlb_player_id']
-hand_map = id_data[['batting_hand','sportradar_player_id']].set_index('sportradar_player_id').to_dict()['batting_hand']
-name_map = id_data[['full_name','sportradar_player_id']].set_index('sportradar_player_id').to_dict()['full_name']
+def players_connection():
+    # A SQLite copy of the players table (PL_DB_SQLITE) stands in for the database, e.g. for local testing
+    if os.environ.get('PL_DB_SQLITE'):
+        return sqlite3.connect(os.environ['PL_DB_SQLITE'])
+    import psycopg2
+    return psycopg2.connect(f"dbname='{os.environ.get('PL_DB_DATABASE')}' user='{os.environ.get('PL_DB_USER')}' host='{os.environ.get('PL_DB_HOST')}' password='{os.environ.get('PL_DB_PASSWORD')}'")
+
+def players_watermark(conn):
+    if PLAYER_MAP_WATERMARK is None:
+        return None
+    watermark_column = checked_columns([PLAYER_MAP_WATERMARK])[0]
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT max({watermark_column}) FROM players")
+    watermark = cursor.fetchone()[0]
+    cursor.close()
+    return str(watermark)
+
+def query_player_maps(conn, batch_size=10000):
+    # Stream only the needed columns (through a server-side cursor on Postgres), building every map in one pass
+    cursor = conn.cursor() if isinstance(conn, sqlite3.Connection) else conn.cursor(name='player_maps')
+    cursor.execute(f"SELECT {', '.join(checked_columns(player_columns))} FROM players")
+    id_map, hand_map, name_map = {}, {}, {}
+    rows = cursor.fetchmany(batch_size)
+    while len(rows) > 0:
+        for sportradar_id, mlb_id, batting_hand, full_name in rows:
+            id_map[sportradar_id] = mlb_id
+            hand_map[sportradar_id] = batting_hand
+            name_map[sportradar_id] = full_name
+        rows = cursor.fetchmany(batch_size)
+    cursor.close()
+    return {'id_map':id_map, 'hand_map':hand_map, 'name_map':name_map}
+
+def player_maps(refresh=False):
+    if ('maps' in player_maps_cache) and not refresh:
+        return player_maps_cache['maps']
+
+    snapshot = None
+    if os.path.exists(PLAYER_MAP_SNAPSHOT) and not refresh:
+        with open(PLAYER_MAP_SNAPSHOT,'rb') as f:
+            snapshot = pickle.load(f)
+    if (snapshot is None) or (time.time() - os.path.getmtime(PLAYER_MAP_SNAPSHOT) >= PLAYER_MAP_TTL):
+        conn = players_connection()
+        try:
+            watermark = players_watermark(conn)
+            if (snapshot is None) or (watermark is None) or (watermark != snapshot['watermark']):
+                snapshot = {'watermark':watermark, 'maps':query_player_maps(conn)}
+        finally:
+            conn.close()
+        # Rewritten even if nothing changed, which restarts the TTL
+        tmp_path = f'{PLAYER_MAP_SNAPSHOT}.{os.getpid()}.tmp'
+        with open(tmp_path,'wb') as f:
+            pickle.dump(snapshot, f)
+        os.replace(tmp_path, PLAYER_MAP_SNAPSHOT)
+
+    player_maps_cache['maps'] = snapshot['maps']
+    return snapshot['maps']
 
 team_map = {
     'ANA':'LAA', 'ATL':'ATL', 'AZ':'ARI', 'BAL':'BAL', 'BOS':'BOS', 
@@ -36,62 +100,134 @@ team_map = {
     'STL':'STL', 'TB':'TBR', 'TEX':'TEX','TOR':'TOR', 'WSH':'WSN'
 }
 
-def extract_pitcher_values(dictionary):
-    if len(dictionary.keys())==0:
-        game_id = None
-        home_team = None
-        home_starter_id = None
-        home_starter_name = None
-        home_starter_designation = None
-        away_team = None
-        away_starter_id = None
-        away_starter_name = None
-        away_starter_designation = None
-    else:
-        game_id = dictionary['Id']
-        if dictionary['Teams'][0]['IsHome']==1:
-            home_team = dictionary['Teams'][0]['Code']
-            home_starter_id = dictionary['Teams'][0]['StartingPitcher']['SportsDataId']
-            home_starter_name = dictionary['Teams'][0]['StartingPitcher']['FirstName'] + ' ' + dictionary['Teams'][0]['StartingPitcher']['LastName']
-            home_starter_designation = dictionary['Teams'][0]['StartingPitcher']['Designation']
-            if len(dictionary['Teams']) >1:
-                away_team = dictionary['Teams'][1]['Code']
-                away_starter_id = dictionary['Teams'][1]['StartingPitcher']['SportsDataId']
-                away_starter_name = dictionary['Teams'][1]['StartingPitcher']['FirstName'] + ' ' + dictionary['Teams'][1]['StartingPitcher']['LastName']
-                away_starter_designation = dictionary['Teams'][1]['StartingPitcher']['Designation']
-            else:
-                away_team = None
-                away_starter_id = None
-                away_starter_name = None
-                away_starter_designation = None
-        else:
-            away_team = dictionary['Teams'][0]['Code']
-            away_starter_id = dictionary['Teams'][0]['StartingPitcher']['SportsDataId']
-            away_starter_name = dictionary['Teams'][0]['StartingPitcher']['FirstName'] + ' ' + dictionary['Teams'][0]['StartingPitcher']['LastName']
-            away_starter_designation = dictionary['Teams'][0]['StartingPitcher']['Designation']
-            if len(dictionary['Teams']) >1:
-                home_team = dictionary['Teams'][1]['Code']
-                home_starter_id = dictionary['Teams'][1]['StartingPitcher']['SportsDataId']
-                home_starter_name = dictionary['Teams'][1]['StartingPitcher']['FirstName'] + ' ' + dictionary['Teams'][1]['StartingPitcher']['LastName']
-                home_starter_designation = dictionary['Teams'][1]['StartingPitcher']['Designation']
-            else:
-                home_team = None
-                home_starter_id = None
-                home_starter_name = None
-                home_starter_designation = None
-    
-    return game_id, home_team, home_starter_id, home_starter_name, home_starter_designation, away_team, away_starter_id, away_starter_name, away_starter_designation
-
-def sp_schedule(start_date=datetime.date.today(),n_days=21):
-    week_df = pd.DataFrame()
-    for day in pd.date_range(start_date, periods=n_days):
-        test_starters = pd.read_json('https://api.rotowire.com/Baseball/MLB/ProjectedStarters.php?key=ef2o9hi032uibd013bhd&format=json&date='+day.strftime('%m%d%Y'))
-        test_starters[['game_id', 'home_team', 'home_starter_id', 'home_starter_name', 'home_starter_designation', 
-                        'away_team', 'away_starter_id', 'away_starter_name', 'away_starter_designation']] = None
-        if test_starters.shape[0]>0:
-            test_starters[['game_id', 'home_team', 'home_starter_id', 'home_starter_name', 'home_starter_designation', 
-                        'away_team', 'away_starter_id', 'away_starter_name', 'away_starter_designation']] = test_starters['Games'].apply(lambda x: pd.Series(extract_pitcher_values(x)))
-        week_df = pd.concat([week_df,test_starters], ignore_index=True)
+ROTOWIRE_URL = 'https://api.rotowire.com/Baseball/MLB/ProjectedStarters.php'
+ROTOWIRE_KEY = 'ef2o9hi032uibd013bhd'
+
+starter_columns = ['game_id', 'home_team', 'home_starter_id', 'home_starter_name', 'home_starter_designation',
+                   'away_team', 'away_starter_id', 'away_starter_name', 'away_starter_designation']
+
+def fetch_day(session, day):
+    # Raw JSON payload, so unchanged days can be recognized before they're parsed
+    response = session.get(ROTOWIRE_URL, params={'key':ROTOWIRE_KEY, 'format':'json', 'date':day.strftime('%m%d%Y')}, timeout=30)
+    response.raise_for_status()
+    return response.text
+
+def fetch_schedule(days, workers=8):
+    # Pull every day at once, over one session so connections are reused
+    with requests.Session() as session:
+        session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda day: fetch_day(session, day), days))
+
+def parse_starters(day_dfs):
+    # One row per game (as returned by the endpoint), with each side's team & starter as columns
+    week_df = pd.concat(day_dfs, ignore_index=True)
+    games = week_df['Games'].tolist() if 'Games' in week_df.columns else []
+    games = [game if isinstance(game, dict) else {} for game in games]
+    week_df['game_id'] = [game.get('Id') for game in games]
+
+    # Flatten every team in every game into one table: game row, position in the game's Teams list, and the starter's fields
+    teams = pd.json_normalize([{**team, 'row':row, 'slot':slot}
+                               for row, game in enumerate(games)
+                               for slot, team in enumerate(game.get('Teams', [])[:2])])
+    for col in starter_columns[1:]:
+        week_df[col] = None
+    if len(teams)==0:
+        return week_df
+
+    # The first team listed is home if its IsHome flag is set, and the second team is the other side
+    first_home = teams.loc[teams['slot']==0].set_index('row')['IsHome'].eq(1)
+    teams['side'] = np.where(teams['row'].map(first_home) == (teams['slot']==0), 'home', 'away')
+    teams['starter_name'] = teams['StartingPitcher.FirstName'] + ' ' + teams['StartingPitcher.LastName']
+    for side in ['home','away']:
+        side_teams = teams.loc[teams['side']==side].set_index('row')
+        for col, team_col in [('team','Code'), ('starter_id','StartingPitcher.SportsDataId'),
+                              ('starter_name','starter_name'), ('starter_designation','StartingPitcher.Designation')]:
+            week_df[f'{side}_{col}'] = side_teams[team_col].reindex(week_df.index).astype(object).where(lambda x: x.notna(), None)
+    return week_df
+
+# Every sp_schedule() result is kept as a snapshot named by its fetch time, next to the parsed payload of each day
+#   schedule_snapshots/schedule_20240501T120000123456.parquet (to the microsecond, so fetches in the same second don't collide)
+#   schedule_snapshots/days/<payload hash>.pkl
+SCHEDULE_SNAPSHOT_DIR = os.environ.get('SCHEDULE_SNAPSHOT_DIR','schedule_snapshots')
+# Only the newest snapshots are kept, along with the day payloads seen since the oldest of them
+SCHEDULE_SNAPSHOT_KEEP = int(os.environ.get('SCHEDULE_SNAPSHOT_KEEP', 100))
+
+def parse_days(payloads, snapshot_dir=SCHEDULE_SNAPSHOT_DIR):
+    # Parsed starters for every day; only payloads that haven't been seen before (by content hash) are parsed
+    day_dir = os.path.join(snapshot_dir,'days')
+    os.makedirs(day_dir, exist_ok=True)
+    paths = [os.path.join(day_dir, hashlib.sha1(payload.encode()).hexdigest()+'.pkl') for payload in payloads]
+    changed = [i for i, path in enumerate(paths) if not os.path.exists(path)]
+    for i, path in enumerate(paths):
+        if i not in changed:
+            os.utime(path) # Marks the payload as still in use, for prune_snapshots
+    if len(changed) > 0:
+        parsed = parse_starters([pd.read_json(io.StringIO(payloads[i])).assign(payload=i) for i in changed])
+        parsed = parsed.drop(columns=['Games'], errors='ignore')
+        for i in changed:
+            parsed.loc[parsed['payload']==i].drop(columns=['payload']).to_pickle(paths[i])
+    return pd.concat([pd.read_pickle(path) for path in paths], ignore_index=True)
+
+def list_snapshots(snapshot_dir=SCHEDULE_SNAPSHOT_DIR):
+    # Fetch times of the stored snapshots, oldest first
+    # Names without microseconds (written before they were added, or at .000000) read as microsecond 0
+    if not os.path.isdir(snapshot_dir):
+        return []
+    stamps = [name[len('schedule_'):-len('.parquet')] for name in os.listdir(snapshot_dir)
+              if name.startswith('schedule_') and name.endswith('.parquet')]
+    return sorted(datetime.datetime.strptime(stamp, '%Y%m%dT%H%M%S%f' if len(stamp) > 15 else '%Y%m%dT%H%M%S') for stamp in stamps)
+
+def snapshot_path(fetch_time, snapshot_dir=SCHEDULE_SNAPSHOT_DIR):
+    stamp_format = '%Y%m%dT%H%M%S%f' if fetch_time.microsecond else '%Y%m%dT%H%M%S'
+    return os.path.join(snapshot_dir, fetch_time.strftime(f'schedule_{stamp_format}.parquet'))
+
+def load_snapshot(fetch_time, snapshot_dir=SCHEDULE_SNAPSHOT_DIR):
+    return pd.read_parquet(snapshot_path(fetch_time, snapshot_dir))
+
+def prune_snapshots(keep=SCHEDULE_SNAPSHOT_KEEP, snapshot_dir=SCHEDULE_SNAPSHOT_DIR):
+    # Remove all but the newest keep snapshots, and every day payload that hasn't been seen since the oldest one left
+    fetch_times = list_snapshots(snapshot_dir)
+    if len(fetch_times) <= keep:
+        return
+    for fetch_time in fetch_times[:len(fetch_times)-keep]:
+        os.remove(snapshot_path(fetch_time, snapshot_dir))
+    oldest_kept = fetch_times[len(fetch_times)-keep].timestamp() if keep > 0 else time.time()
+    day_dir = os.path.join(snapshot_dir,'days')
+    for name in os.listdir(day_dir) if os.path.isdir(day_dir) else []:
+        if os.path.getmtime(os.path.join(day_dir, name)) < oldest_kept:
+            os.remove(os.path.join(day_dir, name))
+
+def schedule_diff(old, new):
+    # Starters added, removed & swapped between two sp_schedule() results
+    # Only dates covered by both are compared, so days entering or leaving the window don't show up as changes
+    key_cols = ['Game Date','game_id','h_a']
+    first_date = max(old['Game Date'].min(), new['Game Date'].min())
+    last_date = min(old['Game Date'].max(), new['Game Date'].max())
+    old, new = [df.loc[df['Pitcher Name'].notna() & df['game_id'].notna() & df['Game Date'].between(first_date, last_date)]
+                for df in [old, new]]
+    merged = old.merge(new, how='outer', on=key_cols, suffixes=('_old','_new'), indicator=True)
+    swapped = merged.loc[(merged['_merge']=='both') &
+                         ((merged['Pitcher Name_old']!=merged['Pitcher Name_new']) |
+                          (merged['MLBAMID_old'].fillna(-1)!=merged['MLBAMID_new'].fillna(-1)))]
+    return {'added':new.merge(merged.loc[merged['_merge']=='right_only', key_cols], on=key_cols),
+            'removed':old.merge(merged.loc[merged['_merge']=='left_only', key_cols], on=key_cols),
+            'swapped':swapped[key_cols+['Team_new','Opp_new','MLBAMID_old','Pitcher Name_old','MLBAMID_new','Pitcher Name_new']]
+                      .rename(columns={'Team_new':'Team','Opp_new':'Opp'})
+                      .reset_index(drop=True)}
+
+def latest_changes(snapshot_dir=SCHEDULE_SNAPSHOT_DIR):
+    # Diff of the two most recent snapshots
+    fetch_times = list_snapshots(snapshot_dir)
+    if len(fetch_times) < 2:
+        return None
+    return schedule_diff(load_snapshot(fetch_times[-2], snapshot_dir), load_snapshot(fetch_times[-1], snapshot_dir))
+
+def sp_schedule(start_date=datetime.date.today(),n_days=21,snapshot_dir=SCHEDULE_SNAPSHOT_DIR):
+    fetch_time = datetime.datetime.now()
+    week_df = parse_days(fetch_schedule(pd.date_range(start_date, periods=n_days)), snapshot_dir)
+    maps = player_maps()
+    id_map, name_map = maps['id_map'], maps['name_map']
     week_df['home_team'] = week_df['home_team'].map(team_map)
     week_df['away_team'] = week_df['away_team'].map(team_map)
     week_df['home_mlbamid'] = week_df['home_starter_id'].map(id_map)
@@ -99,7 +235,7 @@ def sp_schedule(start_date=datetime.date.today(),n_days=21):
     week_df['home_starter_name'] = np.where(~week_df['home_starter_id'].isna(),week_df['home_starter_id'].map(name_map),week_df['home_starter_name'])
     week_df['away_starter_name'] = np.where(~week_df['away_starter_id'].isna(),week_df['away_starter_id'].map(name_map),week_df['away_starter_name'])
     
-    return pd.concat([
+    schedule = pd.concat([
         week_df[['Date','game_id','home_mlbamid','home_starter_name','home_team','away_team','home_starter_designation']].rename(columns={
             'Date':'Game Date',
             'home_mlbamid':'MLBAMID',
@@ -117,5 +253,9 @@ def sp_schedule(start_date=datetime.date.today(),n_days=21):
             'away_starter_designation':'Designation'
         }).assign(Park = lambda x: x['Opp'],h_a = 'away')],
         ignore_index=True).sort_values('Game Date')
+    schedule.to_parquet(snapshot_path(fetch_time, snapshot_dir), index=False)
+    prune_snapshots(snapshot_dir=snapshot_dir)
+    return schedule
 
-sp_schedule()[['Game Date','MLBAMID','Pitcher Name','Team','Opp','Park','h_a','game_id','Designation']]
+if __name__ == '__main__':
+    print(sp_schedule()[['Game Date','MLBAMID','Pitcher Name','Team','Opp','Park','h_a','game_id','Designation']])
@@ -1,61 +1,245 @@
 ### Install pybaseball package to import data
 ### Not necessary if you already have the data
-#!pip install pybaseball -q 
-from pybaseball import statcast, cache
-cache.enable() # Optional
+#!pip install pybaseball -q
+### (statcast is imported when it's needed, so the functions below can be used on data you already have)
+
+### Pitches are read from the local Statcast warehouse, which only pulls days it doesn't have yet
+from statcast_warehouse import update_warehouse, query_pitches
 
 import datetime
 import numpy as np
 import pandas as pd
 
-### Season Thresholds (roughly encapsulates the regular season for any given year)
-this_year = 2023
-season_start = datetime.datetime(this_year, 3, 1)
-season_end = datetime.datetime(this_year, 11, 1)
-
-### Use pybaseball to load data for season
-pitch_data = statcast(start_dt=season_start.strftime('%Y-%m-%d'),end_dt=season_end.strftime('%Y-%m-%d'))
-
-### Create a base_state field, containing all of 1B/2B/3B
-for base in ['1b','2b','3b']:
-  pitch_data.loc[pitch_data['on_'+base].notna(),'on_'+base] = int(base[0])
-  pitch_data['on_'+base] = pitch_data['on_'+base].astype('str').replace('<NA>','_')
-pitch_data['base_state'] = pitch_data['on_1b']+' '+pitch_data['on_2b']+' '+pitch_data['on_3b']
-
-### Determine how many runs were scored for each inning
-pitch_data['start_inning_score'] = pitch_data['bat_score'].groupby([pitch_data['game_pk'],pitch_data['inning'],pitch_data['inning_topbot']]).transform('min')
-pitch_data['end_inning_score'] = pitch_data['bat_score'].groupby([pitch_data['game_pk'],pitch_data['inning'],pitch_data['inning_topbot']]).transform('max')
-pitch_data['inning_runs'] = pitch_data['end_inning_score'].sub(pitch_data['start_inning_score']).astype('int')
-
-### This chunk helps pandas sort the base states
-### It's optional and doesn't affect the calculations
-# from pandas.api.types import CategoricalDtype
-# base_state_cats = CategoricalDtype(
-#     ['_ _ _', 
-#      '1 _ _', 
-#      '_ 2 _', 
-#      '_ _ 3', 
-#      '1 2 _', 
-#      '1 _ 3', 
-#      '_ 2 3', 
-#      '1 2 3'], 
-#     ordered=True
-# )
-# pitch_data['base_state'] = pitch_data['base_state'].astype(base_state_cats)
-
-### Generate a dataframe for the 24 base-out states
-### 3 outs x 8 base states
-re_24_df = (pitch_data
-            .dropna(subset=['events']) # Removes pitches that don't end a PA or otherwise change the base-out state
-            .groupby(['game_year','base_state','outs_when_up']) # Find average runs at each base-out state
-            ['inning_runs']
-            .mean()
-            .reset_index()
-            .pivot(index=['game_year','base_state'], # Pivots data so that the 2 dimensions are outs and base state
-                   columns='outs_when_up',
-                   values='inning_runs')
-            .copy()
-)
-
-### Commit year to csv
-re_24_df.to_csv(f'RE24 Matrix - {this_year}.csv')
+### Base-out states are encoded as 5-bit integers:
+### bits 0-2 are runners on 1B/2B/3B, bits 3-4 are outs (so the 24 states are 0-23)
+base_state_labels = np.array([' '.join([str(base+1) if bases & (1 << base) else '_' for base in range(3)]) for bases in range(8)])
+
+### Ball-strike counts are encoded as balls*3 + strikes (0-11)
+count_labels = [f'{balls}-{strikes}' for balls in range(4) for strikes in range(3)]
+
+def base_out_state(pitch_data):
+  bases = (pitch_data['on_1b'].notna().to_numpy(np.int8) |
+           (pitch_data['on_2b'].notna().to_numpy(np.int8) << 1) |
+           (pitch_data['on_3b'].notna().to_numpy(np.int8) << 2))
+  return bases + pitch_data['outs_when_up'].to_numpy(np.int8) * 8
+
+def half_innings(pitch_data):
+  ### Sort pitches by game, half-inning & pitch sequence, and mark where each half-inning starts
+  half = (pitch_data['inning_topbot']=='Bot').to_numpy()
+  game = pitch_data['game_pk'].to_numpy()
+  inning = pitch_data['inning'].to_numpy()
+  order = np.lexsort((pitch_data['pitch_number'].to_numpy(), pitch_data['at_bat_number'].to_numpy(), half, inning, game))
+  game, inning, half = game[order], inning[order], half[order]
+  starts = np.flatnonzero(np.r_[True, (game[1:]!=game[:-1]) | (inning[1:]!=inning[:-1]) | (half[1:]!=half[:-1])])
+  return order, starts
+
+def pitch_states(pitch_data):
+  ### Per-pitch arrays shared by every run table, in game / half-inning / pitch order
+  order, starts = half_innings(pitch_data)
+  n_pitches = len(order)
+  inning_pitches = np.diff(np.r_[starts, n_pitches])
+  score = pitch_data['bat_score'].to_numpy(np.int64)[order]
+  post_score = pitch_data['post_bat_score'].to_numpy(np.int64)[order]
+
+  ### State after each pitch is the state of the next pitch in the half-inning, or 24 (3 outs) after the last one
+  state = base_out_state(pitch_data)[order].astype(np.int64)
+  last_pitch = np.zeros(n_pitches, dtype=bool)
+  last_pitch[np.r_[starts[1:], n_pitches]-1] = True
+  next_state = np.r_[state[1:], 24]
+  next_state[last_pitch] = 24
+
+  years, year_idx = np.unique(pitch_data['game_year'].to_numpy()[order], return_inverse=True)
+  return {'years':years,
+          'year_idx':year_idx,
+          'state':state,
+          'next_state':next_state,
+          'count':(pitch_data['balls'].to_numpy(np.int64).clip(0,3)*3 + pitch_data['strikes'].to_numpy(np.int64).clip(0,2))[order],
+          'events':pitch_data['events'].to_numpy(object)[order],
+          'pa_end':pitch_data['events'].notna().to_numpy()[order],
+          ### Runs in the whole half-inning (max - min batting team score), as the RE24 matrix has always used
+          'inning_runs':np.repeat(np.maximum.reduceat(score, starts) - np.minimum.reduceat(score, starts), inning_pitches),
+          ### Runs from this pitch to the end of the half-inning, and runs scored on the pitch itself
+          'runs_to_end':np.repeat(np.maximum.reduceat(post_score, starts), inning_pitches) - score,
+          'runs_on_play':post_score - score}
+
+def season_sums():
+  ### Running sums & counts for one season; every table is a ratio of these, so chunks of pitches can be added in any order
+  return {'pa':np.zeros(24), 'inning_runs':np.zeros(24), 'pa_runs_to_end':np.zeros(24),
+          'pitches':np.zeros(288), 'runs_to_end':np.zeros(288),
+          'transitions':{}, 'runs_on_play':{}}
+
+def add_sums(sums, pitch_data):
+  ### Add a batch of pitches (whole games) to the per-season sums
+  if len(pitch_data)==0:
+    return sums
+  states = pitch_states(pitch_data)
+  for y, year in enumerate(states['years']):
+    year_sums = sums.setdefault(year, season_sums())
+    in_year = states['year_idx']==y
+    pa = in_year & states['pa_end']
+    state = states['state'][pa]
+    year_sums['pa'] += np.bincount(state, minlength=24)
+    year_sums['inning_runs'] += np.bincount(state, weights=states['inning_runs'][pa], minlength=24)
+    year_sums['pa_runs_to_end'] += np.bincount(state, weights=states['runs_to_end'][pa], minlength=24)
+
+    state_count = states['state'][in_year] * 12 + states['count'][in_year]
+    year_sums['pitches'] += np.bincount(state_count, minlength=288)
+    year_sums['runs_to_end'] += np.bincount(state_count, weights=states['runs_to_end'][in_year], minlength=288)
+
+    ### Event run values only need how often each event moves each state to each other state (25 incl. 3 outs)
+    event_codes, event_names = pd.factorize(states['events'][pa])
+    transitions = np.bincount(event_codes * 600 + state * 25 + states['next_state'][pa],
+                              minlength=len(event_names) * 600).reshape(-1, 24, 25)
+    runs_on_play = np.bincount(event_codes, weights=states['runs_on_play'][pa], minlength=len(event_names))
+    for i, event in enumerate(event_names):
+      year_sums['transitions'][event] = year_sums['transitions'].get(event, 0) + transitions[i]
+      year_sums['runs_on_play'][event] = year_sums['runs_on_play'].get(event, 0) + runs_on_play[i]
+  return sums
+
+def re24(years, expected_runs):
+  ### (game_year, base_state) x outs_when_up, the layout of the original pivot, base states sorted by label
+  label_order = np.argsort(base_state_labels)
+  expected_runs = expected_runs.reshape(-1, 3, 8)[:, :, label_order]
+  return pd.DataFrame(expected_runs.transpose(0, 2, 1).reshape(-1, 3),
+                      index=pd.MultiIndex.from_product([years, base_state_labels[label_order]], names=['game_year','base_state']),
+                      columns=pd.Index([0, 1, 2], name='outs_when_up')).dropna(how='all')
+
+def re288(years, expected_runs):
+  ### (game_year, base_state, outs_when_up) x count
+  label_order = np.argsort(base_state_labels)
+  expected_runs = expected_runs.reshape(-1, 3, 8, 12)[:, :, label_order]
+  return pd.DataFrame(expected_runs.transpose(0, 2, 1, 3).reshape(-1, 12),
+                      index=pd.MultiIndex.from_product([years, base_state_labels[label_order], [0, 1, 2]],
+                                                       names=['game_year','base_state','outs_when_up']),
+                      columns=pd.Index(count_labels, name='count')).dropna(how='all')
+
+def event_run_values(years, sums, re_rest):
+  ### Run value of each event type: RE of the state after - RE of the state before + runs scored on the play
+  rows = []
+  for y, year in enumerate(years):
+    for event, transitions in sums[year]['transitions'].items():
+      count = transitions.sum()
+      if count==0:
+        continue
+      run_value = ((transitions.sum(0) * re_rest[y]).sum() - (transitions.sum(1) * re_rest[y, :24]).sum() +
+                   sums[year]['runs_on_play'][event]) / count
+      rows.append((year, event, run_value, int(count)))
+  return (pd.DataFrame(rows, columns=['game_year','events','run_value','count'])
+          .set_index(['game_year','events'])
+          .sort_index())
+
+def count_run_values(years, pitches, runs_to_end, re_rest):
+  ### Run value of reaching each ball-strike count: runs to the end of the inning, relative to the base-out state's RE
+  pitches = pitches.reshape(-1, 24, 12)
+  relative_runs = runs_to_end.reshape(-1, 24, 12).sum(1) - (pitches * re_rest[:, :24, None]).sum(1)
+  count_pitches = pitches.sum(1)
+  with np.errstate(invalid='ignore', divide='ignore'):
+    run_values = relative_runs / count_pitches
+  return (pd.DataFrame({'run_value':run_values.ravel(), 'pitches':count_pitches.ravel().astype('int64')},
+                       index=pd.MultiIndex.from_product([years, count_labels], names=['game_year','count']))
+          .loc[lambda x: x['pitches']>0])
+
+def run_tables(sums):
+  ### Every table, from the per-season sums
+  years = np.array(sorted(sums))
+  stack = lambda key: np.array([sums[year][key] for year in years]).reshape(len(years), -1)
+  pa, pitches = stack('pa'), stack('pitches')
+  with np.errstate(invalid='ignore', divide='ignore'):
+    ### RE24 averages runs in the whole half-inning, as it always has; the rest use runs from that point on
+    inning_re = stack('inning_runs') / pa
+    ### A 25th state (3 outs) is worth 0 runs, so state transitions that end the inning can be looked up too
+    re_rest = np.nan_to_num(np.c_[stack('pa_runs_to_end') / pa, np.zeros(len(years))])
+    count_re = stack('runs_to_end') / pitches
+  return {'RE24 Matrix':re24(years, inning_re),
+          'RE288 Matrix':re288(years, count_re),
+          'Event Run Values':event_run_values(years, sums, re_rest),
+          'Count Run Values':count_run_values(years, pitches, stack('runs_to_end'), re_rest)}
+
+### Only the columns the tables need are kept from each pull
+pitch_columns = ['game_pk','game_year','inning','inning_topbot','at_bat_number','pitch_number',
+                 'outs_when_up','on_1b','on_2b','on_3b','balls','strikes','bat_score','post_bat_score','fld_score','events']
+
+### Outs recorded by each event (everything else records none)
+event_outs = {'field_out':1, 'strikeout':1, 'force_out':1, 'fielders_choice_out':1, 'sac_fly':1, 'sac_bunt':1, 'other_out':1,
+              'caught_stealing_2b':1, 'caught_stealing_3b':1, 'caught_stealing_home':1,
+              'pickoff_1b':1, 'pickoff_2b':1, 'pickoff_3b':1,
+              'pickoff_caught_stealing_2b':1, 'pickoff_caught_stealing_3b':1, 'pickoff_caught_stealing_home':1,
+              'double_play':2, 'grounded_into_double_play':2, 'strikeout_double_play':2,
+              'sac_fly_double_play':2, 'sac_bunt_double_play':2, 'triple_play':3}
+
+def unfinished_games(pitch_data):
+  ### game_pks whose last half-inning hasn't ended yet: under 3 outs after its last pitch, and not a walk-off
+  ### (batting team ahead in the bottom of the 9th or later). Suspended games look like this until they resume
+  ### Outs on the bases without an event (e.g. a runner thrown out after a hit) aren't counted, so a few finished
+  ### games are held back too; that only delays when they're added, never changes the sums
+  if len(pitch_data)==0:
+    return np.zeros(0, dtype=np.int64)
+  order, starts = half_innings(pitch_data)
+  game = pitch_data['game_pk'].to_numpy()[order]
+  last = order[np.flatnonzero(np.r_[game[1:]!=game[:-1], True])] ### Last pitch of every game
+  last_pitches = pitch_data.iloc[last]
+  column = lambda name: last_pitches[name].to_numpy(np.float64, na_value=np.nan)
+  outs = column('outs_when_up') + last_pitches['events'].astype(object).map(event_outs).fillna(0).to_numpy(np.float64)
+  walk_off = (last_pitches['inning_topbot']=='Bot').to_numpy(bool, na_value=False) & (column('inning') >= 9) & (column('post_bat_score') > column('fld_score'))
+  return last_pitches['game_pk'].to_numpy()[(outs < 3) & ~walk_off]
+
+def date_chunks(start_date, end_date, chunk_days):
+  chunk_start = start_date
+  while chunk_start <= end_date:
+    chunk_end = min(chunk_start + datetime.timedelta(days=chunk_days-1), end_date)
+    yield chunk_start, chunk_end
+    chunk_start = chunk_end + datetime.timedelta(days=1)
+
+def stream_sums(start_date, end_date, chunk_days=7, sums=None, pull=None):
+  ### Pull a date range a few days at a time, adding each chunk to the sums, so only a chunk or two (plus any held-back games) is in memory
+  ### pull is statcast (the default), or anything else with the same (start_dt, end_dt) arguments
+  ### Games that show up again in the next chunk, or whose last half-inning hasn't ended (suspended games, however long
+  ### until they resume), are held back and combined with the next chunk, so a half-inning is never split across two batches
+  if pull is None:
+    from pybaseball import statcast
+    pull = statcast
+  sums = {} if sums is None else sums
+  pending = None
+  for chunk_start, chunk_end in date_chunks(start_date, end_date, chunk_days):
+    chunk = pull(start_dt=chunk_start.strftime('%Y-%m-%d'), end_dt=chunk_end.strftime('%Y-%m-%d'))
+    if len(chunk)==0:
+      continue
+    chunk = chunk[pitch_columns]
+    if pending is not None:
+      carried = pending['game_pk'].isin(chunk['game_pk']) | pending['game_pk'].isin(unfinished_games(pending))
+      add_sums(sums, pending.loc[~carried])
+      chunk = pd.concat([pending.loc[carried], chunk], ignore_index=True)
+    pending = chunk
+  if pending is not None:
+    add_sums(sums, pending)
+  return sums
+
+if __name__ == '__main__':
+  ### Season Thresholds (roughly encapsulates the regular season for any given year)
+  seasons = [2023]
+
+  ### Days per chunk; memory stays flat however many seasons are processed
+  ### Set to None to read each season in one go
+  chunk_days = 7
+
+  warehouse_pull = lambda start_dt, end_dt: query_pitches(pitch_columns, start_dt, end_dt)
+
+  ### Add any missing days to the warehouse, then read each season from it into the running sums
+  sums = {}
+  for year in seasons:
+    season_start = datetime.datetime(year, 3, 1)
+    season_end = datetime.datetime(year, 11, 1)
+    update_warehouse(season_start, season_end)
+    if chunk_days is None:
+      add_sums(sums, query_pitches(pitch_columns, seasons=[year]))
+    else:
+      stream_sums(season_start, season_end, chunk_days, sums, pull=warehouse_pull)
+
+  ### Generate the 24 base-out state matrix (3 outs x 8 base states), the 288 base-out-count matrix,
+  ### and run values per event and per count, for every season
+  tables = run_tables(sums)
+
+  ### Commit each table & year to csv
+  for name, table in tables.items():
+    for year in table.index.get_level_values('game_year').unique():
+      table.loc[[year]].to_csv(f'{name} - {year}.csv')
@@ -10,6 +10,8 @@ import math
 import random
 import timeit
 import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 print("Modules all imported")
 
 #Start time
@@ -45,8 +47,349 @@ def alpha(prepped):
     varterm = 1-(sum_vary/varx)
     return(kterm * varterm)
 
+def player_pools(data, statlist, playeridtype, yearcolumn, yearrange):
+    #Sort once by player & year, so each player-year's events are one contiguous block of rows
+    pool_data = (data
+                 .loc[data[yearcolumn].isin(yearrange), [playeridtype, yearcolumn]+list(statlist)]
+                 .sort_values([playeridtype, yearcolumn], kind='stable'))
+    ids = pool_data[playeridtype].to_numpy()
+    years = pool_data[yearcolumn].to_numpy()
+    starts = np.flatnonzero(np.r_[True, (ids[1:] != ids[:-1]) | (years[1:] != years[:-1])]) if len(ids) > 0 else np.zeros(0, dtype=int)
+    stops = np.r_[starts[1:], len(ids)].astype(int)
+    keys = [str(i)+str(y) for i, y in zip(ids[starts], years[starts])] #Same keys as the old per player-year dictionary
+    values = np.ascontiguousarray(pool_data[list(statlist)].to_numpy(dtype='float64').T) #One row per stat, so every player-year segment is contiguous
+    return keys, values, starts, stops
+
+def sorted_pools(ids, year, values):
+    #player_pools for one year's IDs and (stats x events) values that are already arrays
+    #values is sorted in place (a view of the final pool array), with one year's worth of temporary copy
+    order = np.argsort(ids, kind='stable')
+    ids = ids[order]
+    values[...] = values[:, order]
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]]) if len(ids) > 0 else np.zeros(0, dtype=int)
+    stops = np.r_[starts[1:], len(ids)].astype(int)
+    return [str(i)+str(year) for i in ids[starts]], starts, stops
+
+def year_counts(source, yearcolumn, yearrange, chunksize):
+    #Events per year, so the pool array can be allocated once at its final size before any stats are read
+    #A CSV takes an extra pass over just the year column; a Parquet dataset's row counts come from its metadata
+    if source.endswith('.csv'):
+        counts = pd.Series(0, index=yearrange)
+        for chunk in pd.read_csv(source, usecols=[yearcolumn], chunksize=chunksize):
+            counts = counts.add(chunk[yearcolumn].value_counts(), fill_value=0)
+        return {y: int(counts[y]) for y in yearrange}
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(source, partitioning='hive')
+    return {y: dataset.count_rows(filter=ds.field(yearcolumn) == y) for y in yearrange}
+
+def stream_player_pools(source, statlist, playeridtype, yearcolumn, yearrange, chunksize=1000000):
+    #Same pools as player_pools (in year, then player order), without loading the whole table: reads one year at a
+    #time from a Parquet dataset partitioned by year (see partition_by_year), or a CSV in chunks, keeping only the
+    #ID, year and stat columns. Every year's stats are written straight into the final (stats x events) array, so
+    #peak memory is that array plus one year (Parquet) or one chunk and every event's ID (CSV)
+    counts = year_counts(source, yearcolumn, yearrange, chunksize)
+    years = [y for y in yearrange if counts[y] > 0]
+    offsets = dict(zip(years, np.r_[0, np.cumsum([counts[y] for y in years])[:-1]].astype(int)))
+    values = np.empty((len(statlist), sum(counts[y] for y in years)))
+    keys, starts, stops = [], [], []
+
+    if source.endswith('.csv'):
+        ids_by_year, filled = {y: [] for y in years}, {y: 0 for y in years}
+        for chunk in pd.read_csv(source, usecols=[playeridtype, yearcolumn]+list(statlist), chunksize=chunksize):
+            for y, year_chunk in chunk.loc[chunk[yearcolumn].isin(years)].groupby(yearcolumn):
+                at = offsets[y]+filled[y]
+                values[:, at:at+len(year_chunk)] = year_chunk[list(statlist)].to_numpy(dtype='float64').T
+                ids_by_year[y].append(year_chunk[playeridtype].to_numpy())
+                filled[y] += len(year_chunk)
+            del chunk
+        for y in years:
+            segment = values[:, offsets[y]:offsets[y]+counts[y]]
+            year_keys, year_starts, year_stops = sorted_pools(np.concatenate(ids_by_year.pop(y)), y, segment)
+            keys += year_keys
+            starts.append(year_starts+offsets[y])
+            stops.append(year_stops+offsets[y])
+    else:
+        for y in years:
+            year_data = pd.read_parquet(source, columns=[playeridtype, yearcolumn]+list(statlist), filters=[(yearcolumn, '=', y)])
+            year_keys, year_values, year_starts, year_stops = player_pools(year_data, statlist, playeridtype, yearcolumn, [y])
+            del year_data
+            values[:, offsets[y]:offsets[y]+counts[y]] = year_values
+            keys += year_keys
+            starts.append(year_starts+offsets[y])
+            stops.append(year_stops+offsets[y])
+
+    if len(years) == 0:
+        return [], values, np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    return keys, values, np.concatenate(starts), np.concatenate(stops)
+
+def partition_by_year(data, path, yearcolumn):
+    #Write event-level data as a Parquet dataset partitioned by year, for stream_player_pools
+    data.to_parquet(path, partition_cols=[yearcolumn], index=False)
+
+def load_pools(data, statlist, playeridtype, yearcolumn, yearrange):
+    #data is either a DataFrame, or the path to a year-partitioned Parquet dataset or CSV file
+    #The Statcast warehouse (statcast_warehouse.STATCAST_ROOT) is one of those datasets, with yearcolumn='season'
+    if isinstance(data, str):
+        return stream_player_pools(data, statlist, playeridtype, yearcolumn, yearrange)
+    return player_pools(data, statlist, playeridtype, yearcolumn, yearrange)
+
+def alpha_array(prepped):
+    #Same calculation as alpha(), on an array of (events x player-years), or a stack of them (... x events x player-years)
+    #nan-aware reductions and ddof match the pandas calls in alpha()
+    k = prepped.shape[-2] #Number of "test items"
+    if np.isnan(prepped).any():
+        varx = np.var(np.nansum(prepped, axis=-2), axis=-1) #The variance of all total scores
+        sum_vary = np.nansum(np.nanvar(prepped, axis=-1, ddof=1), axis=-1) #The sum of each event's variance across player-years
+    else: #Much faster without missing values
+        varx = np.var(prepped.sum(axis=-2), axis=-1)
+        sum_vary = prepped.var(axis=-1, ddof=1).sum(axis=-1)
+    return (k/(k-1)) * (1-(sum_vary/varx))
+
+def shuffled_order(starts, stops, rng):
+    #Shuffle the events within every player-year at once: sorting by (player-year + uniform random number)
+    #keeps each player-year's rows together, but in a random order. order[starts[p]:stops[p]] is a permutation of player-year p
+    segment = np.repeat(np.arange(len(starts)), stops-starts)
+    return np.argsort(segment + rng.random(len(segment)), kind='stable')
+
+def reliability_curve(values, starts, stops, samplesizes, rng, min_players=5):
+    #Yields (sample size, (alpha, mean, SD, count of player-years)) for every sample size of one stat
+    #Every sample size uses the first n events of the same shuffle, which is a random sample of n events per player-year
+    order = shuffled_order(starts, stops, rng)
+    lengths = stops-starts
+    for samplesize in samplesizes:
+        eligible = lengths >= samplesize
+        if eligible.sum() < min_players: #Not enough players with enough events; stop at this sample size
+            return
+        prepped = values[order[starts[eligible][:, None] + np.arange(samplesize)]].T #events x player-years
+        yield samplesize, curve_point(prepped)
+
+def curve_point(prepped):
+    #Alpha, mean, standard deviation, and count of player-years for one (events x player-years) sample
+    player_means = np.nanmean(prepped, axis=0)
+    return (alpha_array(prepped), np.nanmean(player_means), np.nanstd(player_means), prepped.shape[1])
+
+def sample_events(values, starts, stops, samplesize, rng, min_players=5):
+    #Independent random sample of samplesize events from every player-year with enough of them, as (events x player-years)
+    #Returns None if fewer than min_players player-years qualify
+    eligible = (stops-starts) >= samplesize
+    if eligible.sum() < min_players:
+        return None
+    lengths = stops[eligible]-starts[eligible]
+    seg_starts = np.r_[0, np.cumsum(lengths)[:-1]]
+    rows = np.repeat(starts[eligible]-seg_starts, lengths) + np.arange(lengths.sum()) #Positions in values of every eligible event
+    order = shuffled_order(seg_starts, seg_starts+lengths, rng)
+    return values[rows[order[seg_starts[:, None] + np.arange(samplesize)]]].T
+
+def bootstrap_alphas(values, starts, stops, samplesize, replicates, rng, max_cells=2**25):
+    #Alpha for each of many bootstrap replicates at one sample size: every replicate resamples the eligible
+    #player-years with replacement, and draws samplesize events from each (without replacement, the same scheme as
+    #sample_events), so the band covers both which players were observed and which of their events were sampled.
+    #Replicates are shuffled and reduced as one (replicates x events x player-years) array, in batches of at most
+    #max_cells shuffled events
+    eligible = (stops-starts) >= samplesize
+    lengths = stops[eligible]-starts[eligible]
+    seg_starts = np.r_[0, np.cumsum(lengths)[:-1]]
+    rows = np.repeat(starts[eligible]-seg_starts, lengths) + np.arange(lengths.sum()) #Positions in values of every eligible event
+    segment = np.repeat(np.arange(len(lengths)), lengths)
+    picks = seg_starts[:, None] + np.arange(samplesize) #First samplesize shuffled events of each player-year
+    batch = max(1, min(replicates, max_cells // max(len(rows), 1)))
+    alphas = []
+    for done in range(0, replicates, batch):
+        size = min(batch, replicates-done)
+        order = np.argsort(segment + rng.random((size, len(rows))), axis=1, kind='stable')
+        players = rng.integers(0, len(lengths), (size, len(lengths))) #Player-years drawn with replacement
+        drawn = order[np.arange(size)[:, None, None], picks[players]] #replicates x player-years x events
+        alphas.append(alpha_array(values[rows[drawn]].transpose(0, 2, 1))) #replicates x events x player-years
+    return np.concatenate(alphas)
+
+#Analytic reliability: instead of resampling, estimate the variance components from every player-year's events
+#Sampling n of a player-year's L events (without replacement), two sampled events covary across player-years by
+#  c = Vb - mean(Vw/(L-1))    (Vb: variance of player-year means; Vw: each player-year's own (population) variance)
+#and each event varies by v = Vb + mean(Vw), so (Spearman-Brown / KR-21) alpha(n) = n*c / (v + (n-1)*c)
+def player_moments(values, starts, stops):
+    #Count, mean and (population) variance of each player-year's events, ignoring missing values
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0)
+    bounds = np.r_[0, np.cumsum(present)], np.r_[0, np.cumsum(filled)], np.r_[0, np.cumsum(filled*filled)]
+    counts, sums, squares = (b[stops]-b[starts] for b in bounds)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums/counts
+        variances = np.maximum(squares/counts - means*means, 0)
+    return counts, means, variances
+
+def variance_components(lengths, means, variances, samplesize, min_players=5):
+    #Between- and within-player terms (c, v) for the player-years with at least samplesize events
+    eligible = (lengths >= samplesize) & ~np.isnan(means) & (lengths > 1)
+    if eligible.sum() < min_players:
+        return None
+    between = np.var(means[eligible], ddof=1)
+    c = between - np.mean(variances[eligible]/(lengths[eligible]-1))
+    v = between + np.mean(variances[eligible])
+    return c, v, eligible
+
+def analytic_curve(values, starts, stops, samplesizes, min_players=5):
+    #Closed-form alpha, mean, SD and count for every sample size, yielded like reliability_curve
+    lengths = stops-starts
+    counts, means, variances = player_moments(values, starts, stops)
+    for samplesize in samplesizes:
+        components = variance_components(lengths, means, variances, samplesize, min_players)
+        if components is None:
+            return
+        c, v, eligible = components
+        a = samplesize*c / (v + (samplesize-1)*c)
+        sample_var = np.var(means[eligible], ddof=1) + np.mean(variances[eligible]*(lengths[eligible]-samplesize)/(samplesize*(lengths[eligible]-1)))
+        yield samplesize, (a, np.mean(means[eligible]), np.sqrt(sample_var), int(eligible.sum()))
+
+def stabilization_point(values, starts, stops, threshold=0.7, min_players=5, iterations=10):
+    #Sample size where alpha reaches threshold: n = t*(v-c) / ((1-t)*c), re-estimating c & v on the
+    #player-years with at least n events until n settles. Returns None if alpha never gets there
+    lengths = stops-starts
+    counts, means, variances = player_moments(values, starts, stops)
+    samplesize = 2
+    for _ in range(iterations):
+        components = variance_components(lengths, means, variances, samplesize, min_players)
+        if components is None or components[0] <= 0:
+            return None
+        c, v, eligible = components
+        crossing = int(math.ceil(threshold*(v-c) / ((1-threshold)*c)))
+        if crossing == samplesize:
+            break
+        samplesize = crossing
+    return samplesize
+
+def validate_analytic(data, statlist, playeridtype, yearcolumn, yearrange, path, threshold=0.7):
+    #Compare the analytic curves with a resampled run's output (e.g. path='str-icr/Str-ICR' or 'str-icr/ICR-BBE'),
+    #at the same sample sizes, and write them side by side to path+"_analytic.csv"
+    resampled = pd.read_csv(path+"_alpha.csv")
+    denom_name = resampled.columns[0]
+    samplesizes = list(resampled[denom_name])
+    keys, values, starts, stops = load_pools(data, statlist, playeridtype, yearcolumn, yearrange)
+    report = resampled[[denom_name]].copy()
+    for stat_i, stat in enumerate(statlist):
+        analytic = [point[0] for samplesize, point in analytic_curve(values[stat_i], starts, stops, samplesizes)]
+        report[stat+"_resampled"] = resampled[stat]
+        report[stat+"_analytic"] = pd.Series(analytic, dtype='float64')
+        resampled_crossing = resampled.loc[resampled[stat] >= threshold, denom_name].min()
+        print(stat+": max |difference|", round((report[stat+"_analytic"]-report[stat+"_resampled"]).abs().max(), 4),
+              "; alpha >=", threshold, "at", resampled_crossing, "(resampled) vs",
+              stabilization_point(values[stat_i], starts, stops, threshold), "(analytic)")
+    report.to_csv(path+"_analytic.csv", index=False)
+    return report
+
+#Parallel runs: every (stat, sample size) cell is a separate task with its own seed stream, derived from
+#(seed, stat, sample size), so the results are the same however many workers run them and in whatever order
+shared_pools = {} #Player pools, as arrays (attached to shared memory in worker processes)
+shared_blocks = [] #Shared memory handles, kept open for the life of a worker
+
+def attach_pools(blocks):
+    for key, (name, shape, dtype) in blocks.items():
+        shm = shared_memory.SharedMemory(name=name)
+        shared_blocks.append(shm)
+        shared_pools[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+def alpha_band(values, starts, stops, stat_i, samplesize, entropy, replicates, band):
+    #Percentile band of alpha across bootstrap replicates, on its own seed stream (NaNs when replicates is 0)
+    if replicates <= 0:
+        return np.nan, np.nan
+    rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(stat_i, samplesize, 1)))
+    return tuple(np.nanpercentile(bootstrap_alphas(values, starts, stops, samplesize, replicates, rng), band))
+
+def pool_task(stat_i, samplesize, entropy, replicates=0, band=(5,95)):
+    values, starts, stops = shared_pools['values'][stat_i], shared_pools['starts'], shared_pools['stops']
+    rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(stat_i, samplesize)))
+    prepped = sample_events(values, starts, stops, samplesize, rng)
+    if prepped is None:
+        return stat_i, None, (np.nan, np.nan)
+    return stat_i, curve_point(prepped), alpha_band(values, starts, stops, stat_i, samplesize, entropy, replicates, band)
+
+def run_tasks(values, starts, stops, tasks, workers=1, seed=None, replicates=0, band=(5,95)):
+    #Runs (stat index, sample size) tasks over a pool of worker processes, yielding (stat index, sample size, point, (lo, hi))
+    #in task order as they finish; point is None once there aren't enough players for that sample size, and
+    #(lo, hi) is the band from that many bootstrap replicates (NaNs without them)
+    #The pools are copied into shared memory once, rather than pickled for every task
+    if len(tasks) == 0:
+        return
+    entropy = np.random.SeedSequence(seed).entropy
+    if workers <= 1:
+        shared_pools.update(values=values, starts=starts, stops=stops)
+        for stat_i, samplesize in tasks:
+            yield (stat_i, samplesize, *pool_task(stat_i, samplesize, entropy, replicates, band)[1:])
+    else:
+        blocks = {}
+        try:
+            for key, arr in (('values', values), ('starts', starts), ('stops', stops)):
+                shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+                np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+                blocks[key] = shm, arr.shape, arr.dtype.str
+            with ProcessPoolExecutor(workers, initializer=attach_pools,
+                                     initargs=({key: (shm.name, shape, dtype) for key, (shm, shape, dtype) in blocks.items()},)) as executor:
+                results = executor.map(pool_task, *zip(*tasks), [entropy]*len(tasks), [replicates]*len(tasks), [band]*len(tasks),
+                                       chunksize=max(1, len(tasks)//(workers*4)))
+                for (stat_i, samplesize), (_, point, bounds) in zip(tasks, results):
+                    yield stat_i, samplesize, point, bounds
+        finally:
+            for shm, shape, dtype in blocks.values():
+                shm.close()
+                shm.unlink()
+
+#Checkpoints: one row per (stat, sample size) cell, appended as soon as the cell is done
+#A row with count 0 marks the sample size where a stat ran out of players
+checkpoint_columns = ['stat', 'samplesize', 'alpha', 'mean', 'sd', 'count', 'alpha_lo', 'alpha_hi']
+
+def load_checkpoint(checkpoint):
+    if not os.path.exists(checkpoint):
+        return pd.DataFrame(columns=checkpoint_columns)
+    return pd.read_csv(checkpoint, dtype={'stat': str})
+
+def write_cell(checkpoint, row):
+    exists = os.path.exists(checkpoint)
+    with open(checkpoint, 'a', newline='') as f:
+        pd.DataFrame([row], columns=checkpoint_columns).to_csv(f, header=not exists, index=False)
+        f.flush()
+        os.fsync(f.fileno())
+
+def checkpoint_table(results, statlist, samplesizes, denom_name, column):
+    #One of the _alpha/_mean/_sd/_count tables: a row per sample size, a column per stat
+    table = (results
+             .pivot(index='samplesize', columns='stat', values=column)
+             .reindex(index=samplesizes, columns=statlist)
+             .dropna(how='all')
+             .rename_axis(index=denom_name, columns=None)
+             .reset_index())
+    if column == 'count':
+        table[statlist] = table[statlist].astype('Int64')
+    return table
+
+def legacy_curve(values, starts, stops, samplesizes, min_players=5):
+    #The original DataFrame-based loop, one column per player-year, for comparison with reliability_curve
+    curve = []
+    for samplesize in samplesizes:
+        prepped = pd.DataFrame({})
+        for p, (start, stop) in enumerate(zip(starts, stops)):
+            if stop-start >= samplesize:
+                prepped[str(p)] = values[start:stop][random.sample(range(stop-start), samplesize)]
+        if prepped.shape[1] < min_players:
+            break
+        curve.append((alpha(prepped), np.mean(prepped.mean()), np.std(prepped.mean()), prepped.shape[1]))
+    return curve
+
+def compare_engines(data, stat, playeridtype, yearcolumn, yearrange, samplesizes, seed=None):
+    #Time the legacy loop against the array engine on one stat (e.g. 'str-icr' from the Str-ICR notebook's data)
+    keys, values, starts, stops = load_pools(data, [stat], playeridtype, yearcolumn, yearrange)
+    legacy_start = timeit.default_timer()
+    legacy = legacy_curve(values[0], starts, stops, samplesizes)
+    legacy_time = timeit.default_timer()-legacy_start
+    array_start = timeit.default_timer()
+    vectorized = [point for samplesize, point in reliability_curve(values[0], starts, stops, samplesizes, np.random.default_rng(seed))]
+    array_time = timeit.default_timer()-array_start
+    print(stat+":", len(legacy), "sample sizes in", round(legacy_time, 2), "s (legacy),",
+          len(vectorized), "in", round(array_time, 2), "s (array);", round(legacy_time/array_time, 1), "x faster")
+    return pd.DataFrame({'samplesize': samplesizes[:len(vectorized)],
+                         'legacy_alpha': [c[0] for c in legacy][:len(vectorized)],
+                         'array_alpha': [c[0] for c in vectorized]})
+
 def calculate(statlist, # list; string of each stat
-              data, # dataframe
+              data, # dataframe, or path to a Parquet dataset partitioned by year (or a CSV), to stream one year at a time
               playeridtype, # string; name of ID column
               yearcolumn, # string; name of year column
               denom_name, # string; denominator name (doesn't need to be in 'data')
@@ -55,59 +398,67 @@ def calculate(statlist, # list; string of each stat
               path, # string;' os path to store output
               maxdenom, # integer;  value for largest sample size
               increment, # integer of increment
-              extradenom=[] # list; additional sample sizes, in addition to the others run by maxdenom & increment combo
+              extradenom=[], # list; additional sample sizes, in addition to the others run by maxdenom & increment combo
+              seed=None, # integer; random seed, for reproducible samples
+              workers=0, # integer; 2+ runs the (stat, sample size) tasks on that many processes, 0 or 1 in this one; results depend only on seed
+              bootstrap=0, # integer; number of bootstrap replicates (player-years resampled with replacement) per sample size, for confidence bands on alpha (0 to skip)
+              band=(5,95), # tuple; lower & upper percentiles of the replicate alphas, written to _alpha_lo.csv & _alpha_hi.csv
+              analytic=False, # boolean; compute the curves in closed form from variance components instead of resampling
+              resume=False # boolean; keep the cells already in path+"_checkpoint.csv" and only run the rest
              ):
     #Create dictionary with every increment of denominator desired
     statnum=[]
     for i in range(1, int(maxdenom/increment)):
         statnum.append(i*increment)
-    statnum.extend(extradenom)
-    statnum.sort()
+    statnum = sorted(set(statnum+list(extradenom))) #extradenom may repeat an increment
     stat_dict = {denom_name:statnum}
 
-    alpha_df, mean_df, sd_df, count_df = pd.DataFrame(stat_dict),pd.DataFrame(stat_dict),pd.DataFrame(stat_dict),pd.DataFrame(stat_dict)  #create dataframes with every increment of denominator desired  
+    #Every finished cell is appended to the checkpoint; the output CSVs are built from it at the end
+    checkpoint = path+"_checkpoint.csv"
+    if not resume and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    done = load_checkpoint(checkpoint)
+    stopped = set(done.loc[done['count'] == 0, 'stat'])
+    finished = set(zip(done['stat'], done['samplesize']))
+    todo = {stat: ([] if stat in stopped else [n for n in statnum if (stat, n) not in finished]) for stat in statlist}
 
-    playerlist = list(data[playeridtype].unique()) #make a list of all player IDs
+    keys, values, starts, stops = load_pools(data, statlist, playeridtype, yearcolumn, yearrange) #Every player-year's events, for all stats, in one pass
+    entropy = np.random.SeedSequence(seed).entropy
+    if analytic: #Bands (if any) still come from bootstrap replicates, in this process
+        cells = ((stat_i, samplesize, point, alpha_band(values[stat_i], starts, stops, stat_i, samplesize, entropy, bootstrap, band))
+                 for stat_i, stat in enumerate(statlist)
+                 for samplesize, point in analytic_curve(values[stat_i], starts, stops, todo[stat]))
+    else: #workers 0 & 1 run the same seeded tasks (and bootstrap replicates) in this process
+        cells = run_tasks(values, starts, stops, [(stat_i, n) for stat_i, stat in enumerate(statlist) for n in todo[stat]],
+                          workers, seed, bootstrap, band)
 
-    #Iterate through different statistics
+    #Alpha (and mean, standard deviation, and count) for each stat & sample size
+    #Curves stop at the first sample size with fewer than five players with enough events
+    last_done = {}
+    for stat_i, samplesize, point, (lo, hi) in cells:
+        stat = statlist[stat_i]
+        if stat in stopped:
+            continue
+        if point is None:
+            write_cell(checkpoint, {'stat': stat, 'samplesize': samplesize, 'count': 0})
+            stopped.add(stat)
+            continue
+        a, m, s, n = point
+        write_cell(checkpoint, {'stat': stat, 'samplesize': samplesize, 'alpha': a, 'mean': m, 'sd': s, 'count': n,
+                                'alpha_lo': lo, 'alpha_hi': hi})
+        last_done[stat] = samplesize
+
+    #Analytic curves just end early, so mark where they ran out of players
     for stat in statlist:
-        alpha_list, mean_list, sd_list, count_list = [],[],[],[] #clear list of alphas, means, standard deviations, and sample sizes
-        nums_dict = {} #Create empty dictionary
-        for i in playerlist: #Populate dictionary with batter numbers for the given statistic
-            for y in yearrange:
-                nums = pd.Series.tolist(data[(data[playeridtype] == i) & (data[yearcolumn] == y)][stat])
-                nums_dict[str(i)+str(y)] = nums
-
-      #Iterate through different numbers of events, each time creating a dataframe that alpha can be calculated from
-        for samplesize in stat_dict[denom_name]:
-            #Create empty dataframe
-            x = {}
-            prepped = pd.DataFrame(x)
-            #Fill that dataframe with a random sample of events
-            for i in nums_dict:
-                if len(nums_dict[i]) >= samplesize:
-                    prepped[str(i)] = random.sample(nums_dict[i], samplesize) #Add the random sample to the prepped dataframe that will be used to calculate alpha 
-         
-            if prepped.shape[1] >= 5: #If there are at least five players with enough events, add alpha to the list of alphas for that stat (and mean, standard deviation, and count)
-                a = alpha(prepped)
-                alpha_list.append(a)
-                m = np.mean(prepped.mean())
-                mean_list.append(m)
-                s = np.std(prepped.mean())
-                sd_list.append(s)
-                n = prepped.shape[1]
-                count_list.append(n)
-            else: #There aren't enough batters to calculate alpha
-                break #stop calculating alpha for this stat and move on to the next stat
-            
-        #Add that list of alphas for that stat to the dataframe containing alpha for all stats
-        alpha_df, mean_df, sd_df, count_df = alpha_df.loc[:len(alpha_list)-1], mean_df.loc[:len(mean_list)-1], sd_df.loc[:len(sd_list)-1], count_df.loc[:len(count_list)-1]
-        alpha_df[stat], mean_df[stat], sd_df[stat], count_df[stat] = (alpha_list, mean_list, sd_list, count_list)
+        if len(todo[stat]) > 0 and stat not in stopped and last_done.get(stat) != todo[stat][-1]:
+            remaining = [n for n in todo[stat] if n > last_done.get(stat, -1)]
+            write_cell(checkpoint, {'stat': stat, 'samplesize': remaining[0], 'count': 0})
         time(stime,msg="Completed "+stat+" for "+path+".")
-    alpha_df.to_csv(path+"_alpha.csv",index=False)
-    mean_df.to_csv(path+"_mean.csv",index=False)
-    sd_df.to_csv(path+"_sd.csv",index=False)
-    count_df.to_csv(path+"_count.csv",index=False)
+
+    results = load_checkpoint(checkpoint)
+    results = results.loc[results['count'] > 0]
+    for column, suffix in [('alpha', '_alpha'), ('mean', '_mean'), ('sd', '_sd'), ('count', '_count')]+([('alpha_lo', '_alpha_lo'), ('alpha_hi', '_alpha_hi')] if bootstrap > 0 else []):
+        checkpoint_table(results, list(statlist), statnum, denom_name, column).to_csv(path+suffix+".csv",index=False)
     print("Completed", path)
 
 print("Functions all defined")
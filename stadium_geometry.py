@@ -0,0 +1,117 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Stadium outlines, as a dict of {team: {segment: (n, 2) array of x/y points}}
+# Shipped next to this file as a .npz (one array per team/segment), built from pybaseball's mlbstadiums.csv
+# and only loaded the first time it's needed. To rebuild it after the outlines change: python stadium_geometry.py
+STADIUM_CSV_URL = 'https://raw.githubusercontent.com/jldbc/pybaseball/master/pybaseball/data/mlbstadiums.csv'
+STADIUM_GEOMETRY_FILE = os.environ.get('STADIUM_GEOMETRY_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stadium_geometry.npz'))
+
+geometry_cache = {}
+
+def build_geometry(source=STADIUM_CSV_URL, path=STADIUM_GEOMETRY_FILE):
+  # Split the outline table into one array per team & segment (keeping the point order), and save it
+  stadium_df = pd.read_csv(source).drop(columns=['Unnamed: 0'], errors='ignore')
+  arrays = {f'{team}/{segment}':points[['x','y']].to_numpy(dtype='float64')
+            for (team, segment), points in stadium_df.groupby(['team','segment'], sort=False)}
+  np.savez_compressed(path, **arrays)
+  return path
+
+def stadium_geometry(path=STADIUM_GEOMETRY_FILE):
+  if path not in geometry_cache:
+    geometry = {}
+    with np.load(path) as arrays:
+      for key in arrays.files:
+        team, segment = key.split('/')
+        geometry.setdefault(team, {})[segment] = arrays[key]
+    geometry_cache[path] = geometry
+  return geometry_cache[path]
+
+def stadium_teams(path=STADIUM_GEOMETRY_FILE):
+  return sorted(stadium_geometry(path))
+
+# Batted ball classification against a park's outlines
+# x/y are in the outline coordinates (the raw mlbstadiums.csv x/y, y increasing towards home plate)
+# pybaseball's spraychart scales the outlines by 2.495/2.33 around (125, 199) to line them up with Statcast's hc_x/hc_y,
+# so spray_coordinates undoes that scale on hc_x/hc_y instead
+spray_center = np.array([125, 199])
+spray_scale = 2.495/2.33
+polygon_cache = {}
+
+def spray_coordinates(hc_x, hc_y):
+  x = (np.asarray(hc_x, dtype='float64') - spray_center[0]) / spray_scale + spray_center[0]
+  y = (np.asarray(hc_y, dtype='float64') - spray_center[1]) / spray_scale + spray_center[1]
+  return x, y
+
+def polygon_edges(points):
+  # (x0, y0, x1, y1) of every edge of the closed polygon through points
+  points = np.asarray(points, dtype='float64')
+  closed = np.r_[points, points[:1]]
+  return closed[:-1,0], closed[:-1,1], closed[1:,0], closed[1:,1]
+
+def points_in_polygon(x, y, edges):
+  # Even-odd ray casting, one pass over the polygon's edges with all points at once
+  inside = np.zeros(len(x), dtype=bool)
+  with np.errstate(invalid='ignore', divide='ignore'):
+    for x0, y0, x1, y1 in zip(*edges):
+      inside ^= ((y0 > y) != (y1 > y)) & (x < (x1 - x0) * (y - y0) / (y1 - y0) + x0)
+  return inside
+
+def outline_polygon(points, home):
+  # Most outlines already run round home plate (the fence carries on round the foul territory);
+  # open arcs (e.g. the Rogers Centre infield) are closed through home plate
+  edges = polygon_edges(points)
+  if points_in_polygon(home[None,0], home[None,1], edges)[0]:
+    return edges
+  return polygon_edges(np.r_[points, home[None]])
+
+def park_polygons(team, path=STADIUM_GEOMETRY_FILE):
+  # Home plate, foul poles (as offsets from home), and the infield & fence polygons, computed once per park
+  if (path, team) not in polygon_cache:
+    park = stadium_geometry(path)[team]
+    if 'foul_lines' in park:
+      # The foul lines meet at the back of home plate, their point nearest the backstop; the poles are their
+      # farthest points on either side of it
+      foul_lines = park['foul_lines']
+      home = foul_lines[np.argmax(foul_lines[:,1])]
+      offsets = foul_lines - home
+      distance = (offsets**2).sum(1)
+      left = offsets[np.argmax(np.where(offsets[:,0] < 0, distance, -1))]
+      right = offsets[np.argmax(np.where(offsets[:,0] > 0, distance, -1))]
+    else:
+      # Outlines without foul lines (the generic park): home is the infield's point nearest the backstop, lines at 45 degrees
+      home = park['infield_outer'][np.argmax(park['infield_outer'][:,1])]
+      left, right = np.array([-1., -1.]), np.array([1., -1.])
+    polygon_cache[(path, team)] = {
+        'home':home,
+        'left':left,
+        'right':right,
+        'infield':outline_polygon(park['infield_outer'], home),
+        'fence':outline_polygon(park['outfield_outer'], home),
+    }
+  return polygon_cache[(path, team)]
+
+def classify_batted_balls(x, y, team, path=STADIUM_GEOMETRY_FILE):
+  # fair/foul (between the foul lines), infield (inside the infield_outer arc),
+  # outfield (fair, past the infield & inside the fence), and cleared (fair & beyond outfield_outer)
+  x, y = np.asarray(x, dtype='float64'), np.asarray(y, dtype='float64')
+  polygons = park_polygons(team, path)
+  px, py = x - polygons['home'][0], y - polygons['home'][1]
+  left, right = polygons['left'], polygons['right']
+  cross = lambda a, bx, by: a[0] * by - a[1] * bx
+  # Between the two foul lines, and in front of home plate rather than in the mirror-image wedge behind it
+  fair = ((cross(left, px, py) * cross(left, right[0], right[1]) >= 0) &
+          (cross(right, px, py) * cross(right, left[0], left[1]) >= 0) &
+          (px * (left[0] + right[0]) + py * (left[1] + right[1]) >= 0))
+  infield = points_in_polygon(x, y, polygons['infield'])
+  cleared = fair & ~points_in_polygon(x, y, polygons['fence'])
+  return pd.DataFrame({'fair':fair, 'infield':infield, 'outfield':fair & ~infield & ~cleared, 'cleared':cleared})
+
+def classify_all_parks(x, y, teams=None, path=STADIUM_GEOMETRY_FILE):
+  # The same batted balls re-parked into every stadium; columns are (team, classification)
+  teams = stadium_teams(path) if teams is None else teams
+  return pd.concat({team:classify_batted_balls(x, y, team, path) for team in teams}, axis=1)
+
+if __name__ == '__main__':
+  print(build_geometry())
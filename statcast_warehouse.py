@@ -0,0 +1,128 @@
+import datetime
+import os
+import pandas as pd
+
+# Local Statcast pitch warehouse
+# Every pitch pulled with pybaseball is kept in a Parquet dataset, partitioned by season and day:
+#   statcast_data/season=2023/day=2023-05-01/<file>.parquet
+# update_warehouse() only pulls the days that aren't stored yet, so a daily run appends one day,
+# and query_pitches() only opens the partitions (and columns) a job asks for.
+
+STATCAST_ROOT = os.environ.get('STATCAST_ROOT','statcast_data')
+
+# Typed schema for the stored columns; anything else in the statcast() pull is dropped
+# Columns missing from a pull (e.g. bat tracking before 2024) are stored as nulls, so every file has the same schema
+# Integers are nullable for the same reason
+# Pitch locations & strike zones stay float64: zone edges are inclusive (see strike_zones.py), and float32 rounding
+# (0.83 -> 0.82999998) would move pitches that sit exactly on an edge into the next zone
+statcast_schema = {
+    'game_date':'datetime64[ns]', 'game_pk':'Int64', 'game_year':'Int16', 'game_type':'category',
+    'home_team':'category', 'away_team':'category',
+    'inning':'Int8', 'inning_topbot':'category', 'at_bat_number':'Int16', 'pitch_number':'Int8',
+    'outs_when_up':'Int8', 'balls':'Int8', 'strikes':'Int8', 'on_1b':'Int64', 'on_2b':'Int64', 'on_3b':'Int64',
+    'bat_score':'Int16', 'post_bat_score':'Int16', 'fld_score':'Int16',
+    'batter':'Int64', 'pitcher':'Int64', 'player_name':'string', 'stand':'category', 'p_throws':'category',
+    'pitch_type':'category', 'pitch_name':'category', 'release_speed':'float32', 'release_spin_rate':'float32',
+    'pfx_x':'float32', 'pfx_z':'float32', 'plate_x':'float64', 'plate_z':'float64', 'sz_top':'float64', 'sz_bot':'float64',
+    'zone':'Int8', 'type':'category', 'description':'category', 'events':'category', 'bb_type':'category',
+    'launch_speed':'float32', 'launch_angle':'float32', 'hit_distance_sc':'float32', 'hc_x':'float32', 'hc_y':'float32',
+    'estimated_woba_using_speedangle':'float32', 'woba_value':'float32', 'woba_denom':'float32', 'delta_run_exp':'float32',
+    'bat_speed':'float32', 'swing_length':'float32',
+}
+
+# Days that were pulled but had no pitches (off days, the All-Star break), so they aren't pulled again
+# Only days up to the last day a pull returned pitches for are recorded; an empty pull, or the days after
+# the last one with pitches, may just be data that isn't published yet, so those are pulled again next time
+NO_GAMES_FILE = '_no_games.txt'
+
+# Savant can publish a day's pitches over a day or two, so the last SETTLE_DAYS days before today aren't
+# treated as stored: every update pulls them again and replaces their partitions, until they're older than that
+SETTLE_DAYS = int(os.environ.get('STATCAST_SETTLE_DAYS', 3))
+
+def apply_schema(df):
+    df = df.reindex(columns=list(statcast_schema))
+    df['game_date'] = pd.to_datetime(df['game_date'])
+    return df.astype(statcast_schema)
+
+def stored_days(root=STATCAST_ROOT):
+    # Every day with a partition on disk, or recorded as having no games
+    days = set()
+    if not os.path.isdir(root):
+        return days
+    for season in os.listdir(root):
+        if season.startswith('season='):
+            days.update(name.split('=')[1] for name in os.listdir(os.path.join(root,season)) if name.startswith('day='))
+    if os.path.exists(os.path.join(root,NO_GAMES_FILE)):
+        with open(os.path.join(root,NO_GAMES_FILE)) as f:
+            days.update(f.read().split())
+    return days
+
+def write_days(df, root=STATCAST_ROOT):
+    # Add a pull to the warehouse, one partition per season & day; days already stored are replaced, not appended to
+    df = apply_schema(df)
+    df['season'] = df['game_date'].dt.year
+    df['day'] = df['game_date'].dt.strftime('%Y-%m-%d')
+    df.to_parquet(root, partition_cols=['season','day'], index=False, existing_data_behavior='delete_matching')
+
+def missing_runs(start_date, end_date, stored, chunk_days):
+    # Consecutive missing days, in runs of at most chunk_days, so each run is one statcast() call
+    runs = []
+    day = start_date
+    while day <= end_date:
+        if day.strftime('%Y-%m-%d') in stored:
+            day += datetime.timedelta(days=1)
+            continue
+        run_start = day
+        while (day <= end_date) and (day.strftime('%Y-%m-%d') not in stored) and ((day-run_start).days < chunk_days):
+            day += datetime.timedelta(days=1)
+        runs.append((run_start, day-datetime.timedelta(days=1)))
+    return runs
+
+def update_warehouse(start_date, end_date=None, root=STATCAST_ROOT, chunk_days=7, pull=None):
+    # Pull every day between start_date and end_date (default: yesterday) that isn't stored yet
+    # Today is never stored, since its games may not be finished
+    # pull is pybaseball's statcast (the default), or anything else with the same (start_dt, end_dt) arguments
+    if pull is None:
+        from pybaseball import statcast
+        pull = statcast
+    start_date = pd.Timestamp(start_date).date()
+    yesterday = datetime.date.today() - datetime.timedelta(days=1)
+    end_date = yesterday if end_date is None else min(pd.Timestamp(end_date).date(), yesterday)
+    os.makedirs(root, exist_ok=True)
+
+    settled = yesterday - datetime.timedelta(days=SETTLE_DAYS-1)
+    stored = {day for day in stored_days(root) if day < settled.strftime('%Y-%m-%d')}
+    for run_start, run_end in missing_runs(start_date, end_date, stored, chunk_days):
+        pitches = pull(start_dt=run_start.strftime('%Y-%m-%d'), end_dt=run_end.strftime('%Y-%m-%d'))
+        if len(pitches)==0:
+            continue
+        write_days(pitches, root)
+        pulled_days = set(pd.to_datetime(pitches['game_date']).dt.strftime('%Y-%m-%d'))
+        no_games = [day.strftime('%Y-%m-%d') for day in pd.date_range(run_start, max(pulled_days))
+                    if day.strftime('%Y-%m-%d') not in pulled_days]
+        if len(no_games) > 0:
+            with open(os.path.join(root,NO_GAMES_FILE),'a') as f:
+                f.write('\n'.join(no_games)+'\n')
+
+def query_pitches(columns=None, start_date=None, end_date=None, seasons=None, root=STATCAST_ROOT):
+    # Pitches between two (inclusive) dates and/or in a list of seasons
+    # Only the matching partitions are opened, and only the requested columns are read
+    filters = []
+    if seasons is not None:
+        filters.append(('season','in',[int(season) for season in seasons]))
+    if start_date is not None:
+        filters.append(('season','>=',pd.Timestamp(start_date).year))
+        filters.append(('day','>=',pd.Timestamp(start_date).strftime('%Y-%m-%d')))
+    if end_date is not None:
+        filters.append(('season','<=',pd.Timestamp(end_date).year))
+        filters.append(('day','<=',pd.Timestamp(end_date).strftime('%Y-%m-%d')))
+
+    columns = list(statcast_schema) if columns is None else list(columns)
+    if not os.path.isdir(root):
+        return apply_schema(pd.DataFrame()).reindex(columns=columns)
+    df = pd.read_parquet(root, columns=columns, filters=filters if len(filters) > 0 else None)
+    # Partition columns come back as categories
+    for col in ['season','day']:
+        if col in df.columns:
+            df[col] = df[col].astype('int16' if col=='season' else 'string')
+    return df
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+# Strike zone grid from Strikezone_Heatmap.ipynb, as a library
+# Every pitch gets a 10x10 grid location (h_zone & v_zone, -4 to 5) sized to the batter's strike zone,
+# and the Statcast zone (1-9 in the zone, 11-14 outside it) that grid cell belongs to
+
+zone_start = -4
+zone_cutoff = 5
+
+# Horizontal edges (feet from the middle of the plate, catcher's perspective)
+# Left of the plate the lower edge is inclusive, right of it the upper edge is, as in the notebook
+h_edges_left = np.array([-10/12, -15/24, -5/12, -5/24, 0])
+h_zones_left = np.array([-4, -3, -2, -1, 0, 1])
+h_edges_right = np.array([5/24, 5/12, 15/24, 10/12])
+h_zones_right = np.array([0, 2, 3, 4, 5])
+
+# Vertical edges, from the batter's sz_bot/sz_top (upper edges inclusive)
+# Written the same way as the notebook's comparisons, so pitches exactly on an edge (common, since
+# Statcast locations are rounded to 0.01 ft) land in the same zone
+def v_edges(sz_top, sz_bot):
+  zone_height = sz_top - sz_bot
+  return [sz_bot - zone_height/6, sz_bot, zone_height/6 + sz_bot, zone_height/3 + sz_bot,
+          sz_top - zone_height/2, sz_top - zone_height/3, sz_top - zone_height/6, sz_top, sz_top + zone_height/6]
+
+# Statcast zone of each grid cell, indexed by (h_zone+4)*10 + (v_zone+4)
+statcast_zone_lookup = np.array([
+  11, 11, 11, 11, 11, 13, 13, 13, 13, 13,
+  11, 11, 11, 11, 11, 13, 13, 13, 13, 13,
+  11, 11,  1,  1,  4,  4,  7,  7, 13, 13,
+  11, 11,  1,  1,  4,  4,  7,  7, 13, 13,
+  11, 11,  2,  2,  5,  5,  8,  8, 13, 13,
+  12, 12,  2,  2,  5,  5,  8,  8, 14, 14,
+  12, 12,  3,  3,  6,  6,  9,  9, 14, 14,
+  12, 12,  3,  3,  6,  6,  9,  9, 14, 14,
+  12, 12, 12, 12, 12, 14, 14, 14, 14, 14,
+  12, 12, 12, 12, 12, 14, 14, 14, 14, 14,
+], dtype='int8')
+
+def zone_framework():
+  # All 100 horizontal/vertical zone combinations, with their Statcast zone
+  h_zone, v_zone = np.meshgrid(np.arange(zone_start, zone_cutoff+1), np.arange(zone_start, zone_cutoff+1), indexing='ij')
+  return pd.DataFrame({'h_zone':h_zone.ravel(),
+                       'v_zone':v_zone.ravel(),
+                       'statcast_zone':statcast_zone_lookup})
+
+def h_zones(plate_x):
+  # -4 is left and out of the strike zone, 5 is right and out of it (catcher's perspective)
+  plate_x = np.asarray(plate_x, dtype='float64')
+  zones = np.where(plate_x < 5/24,
+                   h_zones_left[np.digitize(plate_x, h_edges_left)],
+                   h_zones_right[np.digitize(plate_x, h_edges_right, right=True)])
+  return np.where(np.isnan(plate_x), 0, zones).astype('int8')
+
+def v_zones(plate_z, sz_top, sz_bot):
+  # -4 is below and out of the strike zone, 5 is above it
+  # Each pitch's edges are computed once, and its zone is the number of edges below it (a per-row digitize)
+  plate_z, sz_top, sz_bot = [np.asarray(col, dtype='float64') for col in [plate_z, sz_top, sz_bot]]
+  zones = np.full(plate_z.shape, zone_start, dtype='int8')
+  for edge in v_edges(sz_top, sz_bot):
+    zones += plate_z > edge
+  return np.where(np.isnan(plate_z) | np.isnan(sz_top) | np.isnan(sz_bot), 0, zones).astype('int8')
+
+def statcast_zones(h_zone, v_zone):
+  return statcast_zone_lookup[(np.asarray(h_zone) - zone_start) * 10 + (np.asarray(v_zone) - zone_start)]
+
+def prep_zone_locations(df, horizontal_location_column, vertical_location_column,
+                        strikezone_top_column='sz_top', strikezone_bottom_column='sz_bot'):
+  # Adds h_zone, v_zone & statcast_zone to df (rows keep their order)
+  df['h_zone'] = h_zones(df[horizontal_location_column])
+  df['v_zone'] = v_zones(df[vertical_location_column], df[strikezone_top_column], df[strikezone_bottom_column])
+  df['statcast_zone'] = statcast_zones(df['h_zone'], df['v_zone'])
+  return df
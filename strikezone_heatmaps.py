@@ -0,0 +1,138 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+
+from strike_zones import prep_zone_locations, statcast_zone_lookup, zone_start, zone_cutoff
+
+# Batch version of the Strikezone_Heatmap notebook's strikezone_heatmap
+# Zone means for every batter & pitch type come from one grouped pass into a dense
+# (batter, pitch, v_zone, h_zone) array, the colour scale is computed once for the league,
+# and each batter's small multiples are drawn in a process pool
+
+zone_labels = list(range(zone_start, zone_cutoff+1))
+
+def zone_means(df, target_stat, name_lookup_column='batter_name', pitch_column='pitch_name'):
+  # Mean of target_stat in each batter's Statcast zones, for each pitch type plus 'All' pitches,
+  # spread onto the 10x10 grid: means[batter, pitch, v_zone+4, h_zone+4] (and the pitch counts per batter & pitch)
+  if 'statcast_zone' not in df.columns:
+    df = prep_zone_locations(df.copy(), 'plate_x', 'plate_z')
+  batter_codes, batters = pd.factorize(df[name_lookup_column])
+  pitch_codes, pitches = pd.factorize(df[pitch_column])
+  n_batters, n_pitches = len(batters), len(pitches)+1 # Last slot holds pitches without a pitch type
+  pitch_codes = np.where(pitch_codes < 0, n_pitches-1, pitch_codes)
+
+  values = df[target_stat].to_numpy(dtype='float64')
+  valid = (batter_codes >= 0) & ~np.isnan(values)
+  cells = ((batter_codes * n_pitches + pitch_codes) * 14 + df['statcast_zone'].to_numpy(dtype='int64') - 1)[valid]
+  sums = np.bincount(cells, weights=values[valid], minlength=n_batters*n_pitches*14).reshape(n_batters, n_pitches, 14)
+  counts = np.bincount(cells, minlength=n_batters*n_pitches*14).reshape(n_batters, n_pitches, 14)
+
+  # 'All' replaces the untyped slot
+  sums = np.concatenate([sums[:,:-1], sums.sum(axis=1, keepdims=True)], axis=1)
+  counts = np.concatenate([counts[:,:-1], counts.sum(axis=1, keepdims=True)], axis=1)
+  with np.errstate(invalid='ignore', divide='ignore'):
+    means = sums / counts
+  grids = means[:, :, statcast_zone_lookup-1].reshape(n_batters, n_pitches, 10, 10).transpose(0, 1, 3, 2)
+  return list(batters), list(pitches)+['All'], grids, counts.sum(axis=2)
+
+def color_scale(df, target_stat, name_lookup_column='batter_name'):
+  # 90th percentile of batters' in-zone means (by Statcast's own zone), as in the notebook; vmin is its negative
+  in_zone = df['zone'].isin(range(1,10)).to_numpy() & df[target_stat].notna().to_numpy()
+  batter_codes, batters = pd.factorize(df.loc[in_zone, name_lookup_column])
+  cells = batter_codes * 9 + df.loc[in_zone, 'zone'].to_numpy(dtype='int64') - 1
+  keep = batter_codes >= 0
+  sums = np.bincount(cells[keep], weights=df.loc[in_zone, target_stat].to_numpy(dtype='float64')[keep], minlength=len(batters)*9)
+  counts = np.bincount(cells[keep], minlength=len(batters)*9)
+  vmax = np.quantile(sums[counts > 0] / counts[counts > 0], 0.9)
+  return -vmax, vmax
+
+def draw_heatmap(grid, ax, vmin, vmax):
+  # Same styling as the notebook's strikezone_heatmap, for one (v_zone x h_zone) grid
+  heatmap = sns.heatmap(pd.DataFrame(grid, index=zone_labels, columns=zone_labels),
+              vmin=vmin,
+              center=0,
+              vmax=vmax,
+              cbar=False,
+              cmap='vlag',
+              ax=ax)
+
+  blank_color = '#333333' # Filler color for locations with no data
+  heatmap.set_facecolor(blank_color)
+
+  ## Add strikezone lines
+  # Within-strikezone Grid
+  ax.axhline(4, xmin=0.2, xmax=0.8, color=blank_color, linewidth=2)
+  ax.axhline(6, xmin=0.2, xmax=0.8, color=blank_color, linewidth=2)
+  ax.axvline(4, ymin=0.2, ymax=0.8, color=blank_color, linewidth=2)
+  ax.axvline(6, ymin=0.2, ymax=0.8, color=blank_color, linewidth=2)
+
+  # Out-of-strikezone Grid
+  ax.axhline(5, xmin=0.8, xmax=1, color=blank_color, linewidth=2)
+  ax.axhline(5, xmin=0, xmax=0.2, color=blank_color, linewidth=2)
+  ax.axvline(5, ymin=0.8, ymax=1, color=blank_color, linewidth=2)
+  ax.axvline(5, ymin=0, ymax=0.2, color=blank_color, linewidth=2)
+
+  # Strikezone
+  ax.axhline(2, xmin=0.2, xmax=0.8, color='black', linewidth=2*2)
+  ax.axhline(8, xmin=0.2, xmax=0.8, color='black', linewidth=2*2)
+  ax.axvline(2, ymin=0.2, ymax=0.8, color='black', linewidth=2*2)
+  ax.axvline(8, ymin=0.2, ymax=0.8, color='black', linewidth=2*2)
+
+  ax.set(xlabel=None, ylabel=None)
+  ax.set_xticklabels([])
+  ax.set_yticklabels([])
+  ax.tick_params(left=False, bottom=False)
+
+  sns.despine(ax=ax, left=False, bottom=False)
+
+def render_batter(batter, pitch_labels, grids, vmin, vmax, path, ncols=4, subplot_size=2.5):
+  # One file per batter, with a heatmap for each pitch type they've seen enough of
+  nrows = int(np.ceil(len(pitch_labels)/ncols))
+  fig, axs = plt.subplots(nrows, ncols, figsize=(ncols*subplot_size, nrows*subplot_size*1.1), squeeze=False)
+  for ax, pitch, grid in zip(axs.flat, pitch_labels, grids):
+    draw_heatmap(grid, ax, vmin, vmax)
+    ax.set_title(pitch)
+  for ax in axs.flat[len(pitch_labels):]:
+    ax.axis('off')
+  fig.suptitle(str(batter), fontsize=16)
+  fig.savefig(path, bbox_inches='tight', dpi=150)
+  plt.close(fig)
+  return path
+
+def agg_backend():
+  # Worker processes draw off-screen; the importing session's backend is left alone
+  matplotlib.use('Agg')
+
+def render_all(df, target_stat, out_dir, name_lookup_column='batter_name', pitch_column='pitch_name',
+               min_pitches=50, workers=None):
+  # Heatmaps for every batter (one PNG each) across a process pool; only each batter's small grid slice is sent to a worker
+  batters, pitch_labels, grids, pitch_counts = zone_means(df, target_stat, name_lookup_column, pitch_column)
+  vmin, vmax = color_scale(df, target_stat, name_lookup_column)
+  os.makedirs(out_dir, exist_ok=True)
+
+  jobs = []
+  for b, batter in enumerate(batters):
+    shown = np.flatnonzero(pitch_counts[b] >= min_pitches)
+    if len(shown)==0:
+      continue
+    path = os.path.join(out_dir, re.sub(r'[^\w\-]+', '_', str(batter))+'.png')
+    jobs.append((batter, [pitch_labels[p] for p in shown], grids[b, shown], vmin, vmax, path))
+
+  with ProcessPoolExecutor(max_workers=workers, initializer=agg_backend) as executor:
+    return list(executor.map(render_batter, *zip(*jobs))) if len(jobs) > 0 else []
+
+if __name__ == '__main__':
+  from statcast_warehouse import query_pitches
+  agg_backend()
+
+  season = 2023
+  target_stat = 'delta_run_exp'
+  pitch_data = query_pitches(['batter','pitch_name','plate_x','plate_z','sz_top','sz_bot','zone',target_stat], seasons=[season])
+  paths = render_all(pitch_data, target_stat, f'heatmaps_{season}', name_lookup_column='batter')
+  print(f'{len(paths)} heatmaps written')
@@ -5,10 +5,12 @@ import matplotlib.dates as mdates
 import numpy as np
 import pandas as pd
 import seaborn as sns
-import urllib
+import io
 
 from PIL import Image
 from statsmodels.nonparametric.kernel_regression import KernelReg
+from figure_cache import FigureCache, cached_asset
+from swing_speed_data import available_seasons, read_swing_data, prep_swing_data, compact_swing_data, build_hitter_index, player_rows, to_day, from_day, RollingStats
 
 st.title('MLB Swing Speed App')
 st.write('Find me [@Blandalytics](https://twitter.com/blandalytics) and check out the data at [Baseball Savant](https://baseballsavant.mlb.com/leaderboard/bat-tracking)')
@@ -49,25 +51,34 @@ count_rates = {
     (3, 0): 0.010149253731343283
 }
 
+season = st.selectbox('Season:', available_seasons()[::-1])
 all_swings = st.toggle('Include Non-Competitive swings?')
 
-@st.cache_data(ttl=60,show_spinner=f"Loading data")
-def load_data(all_swings=all_swings):
-    df = pd.read_parquet('https://github.com/Blandalytics/baseball_snippets/blob/main/2024_swing_speed_data.parquet?raw=true')
-    if all_swings==False:
-        df = df.loc[(df['bat_speed']>=40) &
-                            (df['bat_speed']>df['bat_speed'].groupby(df['Hitter']).transform(lambda x: x.quantile(0.1)))].copy()
-    df['Hitter'] = df['Hitter'].astype('string')
-    df['squared_up_frac'] = df['squared_up_frac'].mul(100)
-    df['blastitos'] = df['blastitos'].mul(100)
-    df['swing_time'] = df['swing_time'].mul(1000)
-    df['game_date'] = pd.to_datetime(df['game_date'])
-    return df
+# cache_resource hands every session the same (read-only) frame, instead of
+# the per-session pickled copy that cache_data makes. Nothing below should modify it.
+@st.cache_resource(ttl=60,show_spinner=f"Loading data")
+def load_data(season=season,all_swings=all_swings):
+    df = compact_swing_data(prep_swing_data(read_swing_data(season),all_swings))
+    # Part of every figure cache key, so charts are redrawn when the data updates
+    data_version = (season, all_swings, len(df), int(df['game_day'].max()), float(df['bat_speed'].sum()))
+    return df, build_hitter_index(df), data_version
     
-swing_data = load_data()
+swing_data, hitter_index, data_version = load_data()
 
-data_start = swing_data['game_date'].min()
-data_end = swing_data['game_date'].max()
+@st.cache_resource
+def figure_cache():
+    # Rendered charts (PNG bytes), shared by all sessions
+    return FigureCache()
+
+@st.cache_resource
+def load_logo():
+    logo_loc = 'https://github.com/Blandalytics/PLV_viz/blob/main/data/PL-text-wht.png?raw=true'
+    return Image.open(io.BytesIO(cached_asset(logo_loc)))
+
+pl_logo = load_logo()
+
+data_start = from_day(swing_data['game_day'].min())
+data_end = from_day(swing_data['game_day'].max())
 
 # st.write(f'(From {data_start.strftime('%b %-d')} to {data_end.strftime('%b %-d'))')
 
@@ -76,7 +87,7 @@ col1, col2 = st.columns(2)
 with col1:
     swing_threshold = st.number_input(f'Min # of Swings (in all situations):',
                                       min_value=0, 
-                                      max_value=swing_data.groupby('Hitter')['Swings'].sum().astype('int').max(),
+                                      max_value=swing_data.groupby('Hitter',observed=True)['Swings'].sum().astype('int').max(),
                                       step=25, 
                                       value=100)
 with col2:
@@ -134,7 +145,7 @@ st.write('Swing Metrics')
 st.dataframe((swing_data if team=='All' else swing_data.loc[swing_data['Team']==team])
              .loc[swing_data['count'].isin(selected_options)]
              .fillna({'blastitos':0})
-             .groupby(['Hitter'])
+             .groupby(['Hitter'],observed=True)
              [['Team','Swings','bat_speed','swing_length','swing_time','swing_acceleration','squared_up_frac',
                'blastitos'
               ]]
@@ -158,7 +169,7 @@ st.dataframe((swing_data if team=='All' else swing_data.loc[swing_data['Team']==
 )
 
 players = list(swing_data
-               .groupby('Hitter')
+               .groupby('Hitter',observed=True)
                [['Swings','bat_speed']]
                .agg({'Swings':'count','bat_speed':'mean'})
                .query(f'Swings >={swing_threshold}')
@@ -176,7 +187,7 @@ with col2:
     stat = list(stat_name_dict.keys())[list(stat_name_dict.values()).index(stat)]
     players = list(swing_data
                    .loc[swing_data['count'].isin(selected_options)]
-               .groupby('Hitter')
+               .groupby('Hitter',observed=True)
                [['Swings',stat]]
                .agg({'Swings':'count',stat:'mean'})
                .query(f'Swings >={updated_threshold}')
@@ -185,7 +196,9 @@ with col2:
                ['Hitter']
               )
 
-if len(swing_data.loc[swing_data['Hitter']==player,'stand'].unique())>1:
+player_data = player_rows(swing_data,hitter_index,player)
+
+if player_data['stand'].nunique()>1:
     handedness = st.select_slider(
         'Hitter Handedness',
         options=['Left', 'All', 'Right'],
@@ -193,8 +206,9 @@ if len(swing_data.loc[swing_data['Hitter']==player,'stand'].unique())>1:
 else:
     handedness = 'All'
 
-season_start = swing_data.loc[swing_data['Hitter']==player,'game_date'].min()
-season_end = swing_data.loc[swing_data['Hitter']==player,'game_date'].max()
+# Player rows are sorted by date
+season_start = from_day(player_data['game_day'].iloc[0])
+season_end = from_day(player_data['game_day'].iloc[-1])
 
 col1, col2 = st.columns(2)
 with col1:
@@ -212,17 +226,21 @@ with col2:
     
 def speed_dist(swing_data,player,stat,handedness):
     fig, ax = plt.subplots(figsize=(6,3))
-    swing_data = swing_data.loc[(swing_data['game_date'].dt.date>=start_date) &
-                                (swing_data['game_date'].dt.date<=end_date) &
-                                (swing_data['count'].isin(selected_options))].copy()
+    player_data = player_rows(swing_data,hitter_index,player,start_date,end_date)
+    player_data = player_data.loc[player_data['count'].isin(selected_options)]
+    swing_data = swing_data.loc[(swing_data['game_day']>=to_day(start_date)) &
+                                (swing_data['game_day']<=to_day(end_date)) &
+                                (swing_data['count'].isin(selected_options))]
     if handedness!='All':
         hand = handedness[0]
-        swing_data = swing_data.loc[(swing_data['stand']==hand)].copy()
+        swing_data = swing_data.loc[(swing_data['stand']==hand)]
+        player_data = player_data.loc[(player_data['stand']==hand)]
+    player_stat = player_data[stat]
 
-    val = swing_data.loc[swing_data['Hitter']==player,stat].mean()
+    val = player_stat.mean()
     color_list = sns.color_palette('vlag',n_colors=len(players))
     player_color = color_list[len(players)-players.index(player)-1] if stat not in ['swing_length','swing_time'] else color_list[players.index(player)-1]
-    sns.kdeplot(swing_data.loc[swing_data['Hitter']==player,stat],
+    sns.kdeplot(player_stat,
                     color=player_color,
                     fill=True,
                     cut=0)
@@ -240,12 +258,12 @@ def speed_dist(swing_data,player,stat,handedness):
     height_g = np.interp(league_val, xs_g, ys_g)
     ax.vlines(league_val, 0, height_g, color='w',alpha=0.5,linestyle='--')
 
-    p = sns.kdeplot(swing_data.loc[swing_data['Hitter']==player,stat],
+    p = sns.kdeplot(player_stat,
                     color=player_color,
                     cut=0)
     if all_swings==True:
-        xlim = (min(swing_data[stat].quantile(0.01),swing_data.loc[swing_data['Hitter']==player,stat].quantile(0.02)),
-                 max(200,swing_data.loc[swing_data['Hitter']==player,stat].quantile(0.99)) if stat == 'swing_time' else swing_data[stat].max())
+        xlim = (min(swing_data[stat].quantile(0.01),player_stat.quantile(0.02)),
+                 max(200,player_stat.quantile(0.99)) if stat == 'swing_time' else swing_data[stat].max())
     else:
         xlim = (ax.get_xlim()[0],ax.get_xlim()[1])
 
@@ -284,66 +302,48 @@ def speed_dist(swing_data,player,stat,handedness):
     sns.despine(left=True)
     fig.text(0.8,-0.15,'@blandalytics\nData: Savant',ha='center',fontsize=10)
     fig.text(0.125,-0.14,'mlb-swing-speed.streamlit.app',ha='left',fontsize=10)
-    st.pyplot(fig)
-speed_dist(swing_data,player,stat,handedness)
-
-def rolling_chart(df,player,stat,handedness):
-    if handedness!='All':
-        hand = handedness[0]
-        df = df.loc[(df['stand']==hand)].copy()
-    rolling_df = (df
-                  .loc[(df['Hitter']==player) &
-                          (df['count'].isin(selected_options)),
-                       ['Hitter','game_date',stat]]
-                  .dropna()
-                  .reset_index(drop=True)
-                  .reset_index()
-                  .rename(columns={'index':'swings'})
-                 )
-    
-    swing_thresh = max(25,int(round(swing_threshold/2/5,0))*5)
-    season_avg = rolling_df[stat].mean()
-    rolling_df['Rolling_Stat'] = rolling_df[stat].rolling(swing_thresh).mean()
-    rolling_df = rolling_df.loc[rolling_df['swings']==rolling_df['swings'].groupby(rolling_df['game_date']).transform('max')].copy()
-    
-    chart_thresh_list = (df
-                         .loc[(df['count'].isin(selected_options))]
-                         .assign(Swing=1)
-                         .groupby('Hitter')
-                         [['Swing',stat]]
-                         .agg({
-                             'Swing':'count',
-                             stat:'mean'
-                         })
-                         .query(f'Swing >= {updated_threshold}')
-                         .copy()
-                        )
-    chart_avg = chart_thresh_list[stat].mean()
-    chart_stdev = chart_thresh_list[stat].std()
-
-    chart_90 = chart_thresh_list[stat].quantile(0.9)
-    chart_75 = chart_thresh_list[stat].quantile(0.75)
-    chart_25 = chart_thresh_list[stat].quantile(0.25)
-    chart_10 = chart_thresh_list[stat].quantile(0.1)
+    return fig
+st.image(figure_cache().get(('speed_dist',player,stat,handedness,tuple(selected_options),count_select,
+                             start_date,end_date,players.index(player),len(players),data_version),
+                            lambda: speed_dist(swing_data,player,stat,handedness)))
+
+@st.cache_resource(ttl=60)
+def rolling_stats(season,all_swings,stat,counts,hand):
+    # Cumulative sums & league percentiles, shared across reruns, sessions and players
+    df, index, _ = load_data(season,all_swings)
+    return RollingStats(df,index,stat,counts,hand)
+
+def rolling_chart(player_list,stat,handedness,windows):
+    hand = None if handedness=='All' else handedness[0]
+    engine = rolling_stats(season,all_swings,stat,tuple(selected_options),hand)
+    player = player_list[0]
+    season_avg = engine.season_avg(player)
+    lines = {(p,w):engine.rolling(p,w) for p in player_list for w in windows}
+    rolling_df = lines[(player,windows[0])]
+
+    chart_avg, (chart_10, chart_25, chart_50, chart_75, chart_90) = engine.bands(updated_threshold)
     
     y_pad = (chart_90-chart_10)/5
-    chart_min = min(rolling_df['Rolling_Stat'].min(),chart_10) - y_pad
-    chart_max = max(rolling_df['Rolling_Stat'].max(),chart_90) + y_pad
+    chart_min = min(np.nanmin([line['Rolling_Stat'].min() for line in lines.values()]),chart_10) - y_pad
+    chart_max = max(np.nanmax([line['Rolling_Stat'].max() for line in lines.values()]),chart_90) + y_pad
 
     if stat in ['swing_length','swing_time']:
-        chart_90 = chart_thresh_list[stat].quantile(0.1)
-        chart_75 = chart_thresh_list[stat].quantile(0.25)
-        chart_25 = chart_thresh_list[stat].quantile(0.75)
-        chart_10 = chart_thresh_list[stat].quantile(0.9)
+        chart_90, chart_75, chart_25, chart_10 = chart_10, chart_25, chart_75, chart_90
     
     line_text_loc = rolling_df['game_date'].min() + pd.Timedelta(days=(rolling_df['game_date'].max() - rolling_df['game_date'].min()).days * 1.05)
     
     fig, ax = plt.subplots(figsize=(6,6))
-    sns.lineplot(data=rolling_df,
+    line_colors = ['w'] + sns.color_palette('Set2', n_colors=max(len(lines)-1,1))
+    for line_color, ((line_player,window), line_df) in zip(line_colors,lines.items()):
+        sns.lineplot(data=line_df,
                      x='game_date',
                      y='Rolling_Stat',
-                     color='w'
+                     color=line_color,
+                     label=(line_player if len(player_list)>1 else '')+(f' ({window})' if len(windows)>1 else '') if len(lines)>1 else None,
+                     ax=ax
                        )
+    if len(lines)>1:
+        ax.legend(loc='upper left', fontsize=8, edgecolor=pl_background)
     
     ax.axhline(season_avg, 
                color='w',
@@ -421,16 +421,24 @@ def rolling_chart(df,player,stat,handedness):
     apostrophe_text = "'" if player[-1]=='s' else "'s"
     hand_text = '' if handedness=='All' else f' as {hand}HH'
     count_text = '' if count_select=='All' else f'; in {count_select} counts'
-    fig.suptitle(f"{player}{apostrophe_text} {metric_text}\nRolling {swing_thresh} Swings{hand_text}{count_text}",
+    title_text = f"{player}{apostrophe_text} {metric_text}" if len(player_list)==1 else f"{metric_text}: {' vs '.join(player_list)}"
+    window_text = '/'.join([str(window) for window in windows])
+    fig.suptitle(f"{title_text}\nRolling {window_text} Swings{hand_text}{count_text}",
                  fontsize=14,
                  y=0.95
                  )
     fig.text(0.9,-0.025,'@blandalytics\nData: Savant',ha='center',fontsize=10)
     fig.text(0.025,-0.02,'mlb-swing-speed.streamlit.app',ha='left',fontsize=10)
     sns.despine()
-    st.pyplot(fig)
+    return fig
 st.write('The rolling chart uses either 25 swings or ~1/2 of the Swings seen in that count, whichever is larger')
-rolling_chart(swing_data,player,stat,handedness)
+compare_players = st.multiselect('Compare rolling chart with:', [x for x in players if x!=player])
+swing_thresh = max(25,int(round(swing_threshold/2/5,0))*5)
+extra_windows = st.multiselect('Add rolling windows (# of swings):', [x for x in [25,50,100,150,200,300] if x!=swing_thresh])
+windows = [swing_thresh] + sorted(extra_windows)
+st.image(figure_cache().get(('rolling_chart',tuple([player]+compare_players),stat,handedness,tuple(windows),
+                             tuple(selected_options),count_select,updated_threshold,data_version),
+                            lambda: rolling_chart([player]+compare_players,stat,handedness,windows)))
 
 zone_df = pd.DataFrame(columns=['x','z'])
 for x in range(-20,21):
@@ -448,7 +456,7 @@ heatmap_stat_dict = {
 def heatmap_data(df,stat,handedness):
     if handedness!='All':
         hand = handedness[0]
-        df = df.loc[(df['stand']==hand)].copy()
+        df = df.loc[(df['stand']==hand)]
     heatmap_df = df.loc[(df['plate_x'].abs()<=2) &
                         (df['sz_z'].abs()<=1.5)].dropna(subset=['bat_speed']).copy()
     heatmap_df.loc[heatmap_df['plate_x'].notna(),'kde_x'] = np.clip(heatmap_df.loc[heatmap_df['plate_x'].notna(),'plate_x'].astype('float').mul(12).round(0).astype('int').div(12),
@@ -461,7 +469,7 @@ def heatmap_data(df,stat,handedness):
     heatmap_df['base_'+stat] = heatmap_df[stat].groupby([heatmap_df['stand'],
                                                     heatmap_df['kde_x'],
                                                     heatmap_df['kde_z'],
-                                                    heatmap_df['count']]).transform('mean')
+                                                    heatmap_df['count']],observed=True).transform('mean')
 
     
     heatmap_df[heatmap_stat_dict[stat][0]] = heatmap_df['base_'+stat].sub(heatmap_df[stat]) if stat in ['swing_time','swing_length'] else heatmap_df[stat].sub(heatmap_df['base_'+stat])
@@ -479,19 +487,20 @@ stat_value_dict = {
 }
 
 def swing_heatmap(df,hitter,base_stat,handedness):
+    # heatmap_data keeps the Hitter sort order, so the hitter is still one block of rows
+    hitter_df = player_rows(df,build_hitter_index(df),hitter)
     if handedness!='All':
         b_hand = handedness[0]
-        df = df.loc[(df['stand']==b_hand)].copy()
     else:
-        b_hand = df.loc[(df['Hitter']==hitter),'stand'].value_counts().index[0]
+        b_hand = hitter_df['stand'].value_counts().index[0]
     stat_dict = {
         heatmap_stat_dict[base_stat][0]:[heatmap_stat_dict[base_stat][1],swing_data[base_stat].mean()/(20 if base_stat=='swing_acceleration' else 15)]
     }
     
     bandwidth = 0.25# if base_stat == 'squared_up_frac' else 0.5
     
-    sz_top = round(df.loc[df['Hitter']==hitter,'sz_top'].median()*12)
-    sz_bot = round(df.loc[df['Hitter']==hitter,'sz_bot'].median()*12)
+    sz_top = round(hitter_df['sz_top'].median()*12)
+    sz_bot = round(hitter_df['sz_bot'].median()*12)
     sz_range = sz_top-sz_bot
     sz_mid = sz_bot + sz_range/2
     
@@ -499,8 +508,7 @@ def swing_heatmap(df,hitter,base_stat,handedness):
         fig, ax = plt.subplots(figsize=(5,6))
         v_center = df[stat].mean()
         kde_df = pd.merge(zone_df,
-                          (df
-                           .loc[(df['Hitter']==hitter)]
+                          (hitter_df
                            .dropna(subset=[stat,'plate_x','sz_z'])
                            [['kde_x','kde_z',stat]]
                           ),
@@ -568,10 +576,8 @@ def swing_heatmap(df,hitter,base_stat,handedness):
         
         kde_thresh=0.05
         # Add PL logo
-        logo_loc = 'https://github.com/Blandalytics/PLV_viz/blob/main/data/PL-text-wht.png?raw=true'
-        logo = Image.open(urllib.request.urlopen(logo_loc))
         pl_ax = fig.add_axes([0.36,-0.19,0.32,0.32], anchor='NE', zorder=1)
-        pl_ax.imshow(logo)
+        pl_ax.imshow(pl_logo)
         pl_ax.set(ylim=(390,0))
         pl_ax.axis('off')
         apostrophe_text = "'" if hitter[-1]=='s' else "'s"
@@ -590,8 +596,9 @@ def swing_heatmap(df,hitter,base_stat,handedness):
         scale_text = ax.annotate(f' is {stat_value_dict[stat][1]}', xycoords=scale_text, fontsize=10,
                                  xy=(1, 0), va="bottom",color="k")
         sns.despine(left=True,bottom=True)
-        st.pyplot(fig)
-swing_heatmap(heatmap_data(swing_data,stat,handedness),player,stat,handedness)
+    return fig
+st.image(figure_cache().get(('swing_heatmap',player,stat,handedness,data_version),
+                            lambda: swing_heatmap(heatmap_data(swing_data,stat,handedness),player,stat,handedness)))
 
 st.header('Assumptions & Formulas')
 st.write('Assumptions:')
@@ -0,0 +1,165 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Data helpers for swing_speed.py
+# The swing data is kept sorted by Hitter, then game_day, so every hitter's
+# swings are one contiguous block of rows that can be sliced without a mask
+
+# Multi-season data lives in a local Parquet dataset, partitioned by season and Team:
+#   swing_data/season=2024/Team=ATL/part-0.parquet
+# Seasons missing locally are read from the single-season files on GitHub
+SWING_DATA_ROOT = os.environ.get('SWING_DATA_ROOT','swing_data')
+SWING_DATA_URL = 'https://github.com/Blandalytics/baseball_snippets/blob/main/{season}_swing_speed_data.parquet?raw=true'
+
+# Columns used by swing_speed.py; everything else is left on disk
+swing_columns = ['Hitter','Team','game_date','count','stand','Swings',
+                 'bat_speed','swing_length','swing_time','swing_acceleration','squared_up_frac','blastitos',
+                 'plate_x','plate_z','sz_z','sz_top','sz_bot']
+
+category_cols = ['Hitter','Team','count','stand']
+
+def to_day(date):
+    # Days since 1970-01-01, the format game_day is stored in
+    return int(np.datetime64(date,'D').astype('int64'))
+
+def from_day(day):
+    return pd.Timestamp(int(day), unit='D')
+
+def available_seasons(root=SWING_DATA_ROOT):
+    seasons = []
+    if os.path.isdir(root):
+        seasons = [int(name.split('=')[1]) for name in os.listdir(root) if name.startswith('season=')]
+    return sorted(seasons) if len(seasons)>0 else [2024]
+
+def partition_swing_data(df, root=SWING_DATA_ROOT):
+    # Add raw swing data (one or more seasons) to the local dataset
+    df = df.assign(game_date = lambda x: pd.to_datetime(x['game_date']))
+    df['season'] = df['game_date'].dt.year
+    df.to_parquet(root, partition_cols=['season','Team'], index=False)
+
+def read_swing_data(season, teams=None, start_date=None, end_date=None, columns=swing_columns, root=SWING_DATA_ROOT):
+    # Only the partitions for the season (and teams) are opened, only the needed
+    # columns are read, and row groups outside the date range are skipped
+    filters = []
+    if teams is not None:
+        filters.append(('Team','in',list(teams)))
+    if start_date is not None:
+        filters.append(('game_date','>=',pd.Timestamp(start_date)))
+    if end_date is not None:
+        filters.append(('game_date','<',pd.Timestamp(end_date)+pd.Timedelta(days=1)))
+
+    if os.path.isdir(os.path.join(root,f'season={season}')):
+        return pd.read_parquet(root, columns=columns, filters=[('season','=',season)]+filters)
+
+    # The GitHub files aren't partitioned, and game_date may not be stored as a timestamp
+    df = pd.read_parquet(SWING_DATA_URL.format(season=season), columns=columns,
+                         filters=filters[:1] if teams is not None else None)
+    if (start_date is not None) or (end_date is not None):
+        game_dates = pd.to_datetime(df['game_date'])
+        df = df.loc[(game_dates>=pd.Timestamp(start_date if start_date is not None else game_dates.min())) &
+                    (game_dates<pd.Timestamp(end_date if end_date is not None else game_dates.max())+pd.Timedelta(days=1))]
+    return df
+
+def prep_swing_data(df, all_swings=False):
+    if all_swings==False:
+        df = df.loc[(df['bat_speed']>=40) &
+                            (df['bat_speed']>df['bat_speed'].groupby(df['Hitter']).transform(lambda x: x.quantile(0.1)))].copy()
+    df['Hitter'] = df['Hitter'].astype('string')
+    df['squared_up_frac'] = df['squared_up_frac'].mul(100)
+    df['blastitos'] = df['blastitos'].mul(100)
+    df['swing_time'] = df['swing_time'].mul(1000)
+    df['game_date'] = pd.to_datetime(df['game_date'])
+    return df
+
+def compact_swing_data(df):
+    # Categorical codes for the repeated strings, float32 metrics, and int32 days for the date
+    df = df.astype({col:'category' for col in category_cols if col in df.columns})
+    float_cols = df.select_dtypes('float64').columns
+    df[float_cols] = df[float_cols].astype('float32')
+    df['game_day'] = df['game_date'].to_numpy().astype('datetime64[D]').astype('int32')
+    df = df.drop(columns=['game_date'])
+    # Sort so each hitter's swings are contiguous, in date order
+    return df.sort_values(['Hitter','game_day'], kind='stable', ignore_index=True)
+
+def build_hitter_index(df):
+    # Map each hitter to the (start, stop) row range of their swings
+    # Assumes df is sorted by Hitter; ranges are positional, for use with .iloc
+    hitters = df['Hitter']
+    if len(hitters)==0:
+        return {}
+    codes = hitters.cat.codes.to_numpy() if hitters.dtype=='category' else hitters.to_numpy()
+    starts = np.flatnonzero(np.r_[True, codes[1:]!=codes[:-1]])
+    stops = np.r_[starts[1:], len(codes)]
+    return {hitter:(start,stop) for hitter, start, stop in zip(hitters.iloc[starts].tolist(), starts, stops)}
+
+def date_bounds(days, start_date=None, end_date=None):
+    # Binary search a sorted game_day array for the rows between two (inclusive) dates
+    lo = 0 if start_date is None else np.searchsorted(days, to_day(start_date), side='left')
+    hi = len(days) if end_date is None else np.searchsorted(days, to_day(end_date), side='right')
+    return lo, hi
+
+def player_rows(df, hitter_index, player, start_date=None, end_date=None):
+    # Zero-copy slice of a hitter's swings, optionally limited to a date range
+    start, stop = hitter_index.get(player, (0,0))
+    if (start_date is not None) or (end_date is not None):
+        lo, hi = date_bounds(df['game_day'].to_numpy()[start:stop], start_date, end_date)
+        start, stop = start+lo, start+hi
+    return df.iloc[start:stop]
+
+class RollingStats:
+    # Rolling & league-percentile engine for one stat, count group and handedness
+    # Keeps a cumulative sum of the stat over the hitter-sorted swings, so any
+    # rolling window (for any hitter) is a difference of two cumulative sums,
+    # and each hitter's season mean is one more difference
+    def __init__(self, df, hitter_index, stat, counts, hand=None):
+        keep = df['count'].isin(counts).to_numpy()
+        if hand is not None:
+            keep = keep & (df['stand']==hand).to_numpy()
+        values = df[stat].to_numpy(dtype='float64')
+        valid = keep & ~np.isnan(values)
+
+        # Positions of the usable swings (still in hitter/date order), and their running totals
+        rows = np.flatnonzero(valid)
+        self.days = df['game_day'].to_numpy()[rows]
+        self.cumsum = np.r_[0, np.cumsum(values[rows])]
+
+        # Per-hitter ranges into rows, plus the number of swings in the count group
+        hitters = list(hitter_index.keys())
+        bounds = np.array(list(hitter_index.values()), dtype='int64').reshape(-1,2)
+        valid_before = np.r_[0, np.cumsum(valid)]
+        keep_before = np.r_[0, np.cumsum(keep)]
+        self.hitter_pos = {hitter:i for i, hitter in enumerate(hitters)}
+        self.starts = valid_before[bounds[:,0]]
+        self.stops = valid_before[bounds[:,1]]
+        self.swings = keep_before[bounds[:,1]] - keep_before[bounds[:,0]]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.means = (self.cumsum[self.stops] - self.cumsum[self.starts]) / (self.stops - self.starts)
+        self.band_cache = {}
+
+    def season_avg(self, player):
+        return self.means[self.hitter_pos[player]] if player in self.hitter_pos else np.nan
+
+    def rolling(self, player, window):
+        # Rolling mean after the last swing of each game date
+        i = self.hitter_pos.get(player)
+        start, stop = (self.starts[i], self.stops[i]) if i is not None else (0,0)
+        sums = self.cumsum[start:stop+1]
+        rolling_stat = np.full(stop-start, np.nan)
+        if stop-start >= window:
+            rolling_stat[window-1:] = (sums[window:] - sums[:-window]) / window
+        days = self.days[start:stop]
+        last_swing = np.r_[days[1:]!=days[:-1], True] if len(days)>0 else np.zeros(0, dtype=bool)
+        return pd.DataFrame({'game_date':pd.to_datetime(days[last_swing], unit='D'),
+                             'Rolling_Stat':rolling_stat[last_swing]})
+
+    def bands(self, threshold):
+        # League average & 10/25/50/75/90th percentiles of hitter means, for hitters with enough swings
+        if threshold not in self.band_cache:
+            qualified = self.means[self.swings>=threshold]
+            qualified = qualified[~np.isnan(qualified)]
+            if len(qualified)==0:
+                self.band_cache[threshold] = (np.nan, np.full(5, np.nan))
+            else:
+                self.band_cache[threshold] = (qualified.mean(), np.percentile(qualified, [10,25,50,75,90]))
+        return self.band_cache[threshold]
@@ -0,0 +1,78 @@
+import ctypes
+import gc
+import os
+import pickle
+import subprocess
+import sys
+import pandas as pd
+
+from swing_speed_data import read_swing_data, prep_swing_data, compact_swing_data
+
+# Memory report for the swing_speed.py dataset
+# st.cache_data keeps a pickle of the frame and unpickles a fresh copy for every session;
+# st.cache_resource builds the frame once and hands every session that same object.
+# Each (layout, cache) combination runs in its own process, which loads the data,
+# serves n_sessions sessions the way that cache would, and reports its RSS growth over
+# the process's own baseline (interpreter + imports), so nothing is shared between measurements.
+#   python swing_speed_memory.py [season | path/to/swing_data.parquet] [n_sessions]
+
+layouts = ['original','compact']
+cache_strategies = ['cache_data','cache_resource']
+
+def rss_mb():
+    # Current resident set size (Linux only)
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+def release_free_memory():
+    # Hand memory freed after loading (read buffers, temporaries) back to the OS, so RSS counts only what's kept
+    gc.collect()
+    ctypes.CDLL('libc.so.6').malloc_trim(0)
+
+def frame_mb(df):
+    return df.memory_usage(deep=True).sum() / 2**20
+
+def load_frame(source, layout):
+    if source.endswith('.parquet'):
+        raw_data = pd.read_parquet(source)
+    else:
+        raw_data = read_swing_data(int(source))
+    df = prep_swing_data(raw_data)
+    return compact_swing_data(df) if layout=='compact' else df
+
+def measure(source, layout, strategy, n_sessions):
+    # Runs in a child process; prints frame MB, RSS after loading, and RSS after n_sessions sessions
+    start_rss = rss_mb()
+    df = load_frame(source, layout)
+    size = frame_mb(df)
+    if strategy=='cache_data':
+        # What Streamlit stores: the pickled frame (the loaded frame itself is dropped)
+        cached = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+        del df
+        release_free_memory()
+        loaded_rss = rss_mb() - start_rss
+        sessions = [pickle.loads(cached) for _ in range(n_sessions)]
+        # Touch every copy, as each session's charts would
+        sum(len(session) for session in sessions)
+    else:
+        release_free_memory()
+        loaded_rss = rss_mb() - start_rss
+        sessions = [df for _ in range(n_sessions)]
+    print(size, loaded_rss, rss_mb() - start_rss)
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1]=='--child':
+        measure(sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5]))
+        sys.exit()
+
+    source = sys.argv[1] if len(sys.argv) > 1 else '2024'
+    n_sessions = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    print(f'{n_sessions} sessions, RSS growth per process (MB)')
+    print(f"{'layout':<10}{'cache':<16}{'frame':>8}{'loaded':>10}{'sessions':>10}{'per session':>13}")
+    for layout in layouts:
+        for strategy in cache_strategies:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', source, layout, strategy, str(n_sessions)],
+                                    capture_output=True, text=True, check=True).stdout
+            size, loaded_rss, total_rss = [float(value) for value in output.split()]
+            print(f'{layout:<10}{strategy:<16}{size:>8.1f}{loaded_rss:>10.1f}{total_rss:>10.1f}{(total_rss-loaded_rss)/n_sessions:>13.1f}')
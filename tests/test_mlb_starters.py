@@ -0,0 +1,148 @@
+import datetime
+import io
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('requests')
+pytest.importorskip('dotenv')
+import requests
+
+import mlb_starters
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'rotowire')
+days = pd.date_range('2024-05-01', periods=3)
+
+def fixture_payload(day):
+    with open(os.path.join(FIXTURES, f"ProjectedStarters_{day.strftime('%m%d%Y')}.json")) as f:
+        return f.read()
+
+class FixtureResponse:
+    def __init__(self, text):
+        self.text = text
+    def raise_for_status(self):
+        pass
+
+@pytest.fixture
+def rotowire(monkeypatch):
+    # Serves the recorded payloads in place of the endpoint, keyed by the date parameter
+    requested = []
+    def get(session, url, params=None, timeout=None):
+        assert url == mlb_starters.ROTOWIRE_URL
+        requested.append(params['date'])
+        return FixtureResponse(fixture_payload(datetime.datetime.strptime(params['date'], '%m%d%Y')))
+    monkeypatch.setattr(requests.Session, 'get', get)
+    return requested
+
+def test_fetch_schedule_keeps_day_order(rotowire):
+    payloads = mlb_starters.fetch_schedule(days, workers=3)
+    assert sorted(rotowire) == ['05012024', '05022024', '05032024']
+    assert payloads == [fixture_payload(day) for day in days]
+
+def test_parse_starters():
+    parsed = mlb_starters.parse_starters([pd.read_json(io.StringIO(fixture_payload(day))) for day in days])
+    columns = ['game_id'] + mlb_starters.starter_columns[1:]
+    expected = pd.DataFrame([
+        [75001, 'NY-A', 'sr-cole', 'Gerrit Cole', 'C', 'BAL', 'sr-burnes', 'Corbin Burnes', 'P'],
+        [75002, 'LA', 'sr-glasnow', 'Tyler Glasnow', 'C', 'SD', 'sr-musgrove', 'Joe Musgrove', 'P'],
+        [None, None, None, None, None, None, None, None, None],
+        # A one-team game listed away first has no home side
+        [75003, None, None, None, None, 'CHI-N', 'sr-imanaga', 'Shota Imanaga', 'P'],
+    ], columns=columns)
+    assert list(parsed['Date'].astype(str).str[:10]) == ['2024-05-01', '2024-05-01', '2024-05-02', '2024-05-02']
+    result = parsed[columns].astype(object).where(parsed[columns].notna(), None)
+    assert result.values.tolist() == expected.astype(object).where(expected.notna(), None).values.tolist()
+
+def test_prune_snapshots(tmp_path):
+    snapshot_dir = str(tmp_path)
+    schedule = pd.DataFrame({'Game Date':['2024-05-01'], 'game_id':[75001], 'h_a':['home'], 'Pitcher Name':['Gerrit Cole']})
+    fetch_times = [datetime.datetime(2024, 5, 1, hour) for hour in range(5)]
+    for fetch_time in fetch_times:
+        schedule.to_parquet(mlb_starters.snapshot_path(fetch_time, snapshot_dir), index=False)
+    # One payload last seen before the kept snapshots, one seen since
+    mlb_starters.parse_days([fixture_payload(days[0]), fixture_payload(days[1])], snapshot_dir)
+    stale, fresh = [os.path.join(snapshot_dir, 'days', name) for name in sorted(os.listdir(os.path.join(snapshot_dir, 'days')))]
+    os.utime(stale, (fetch_times[1].timestamp(),)*2)
+    os.utime(fresh, (fetch_times[4].timestamp(),)*2)
+
+    mlb_starters.prune_snapshots(keep=2, snapshot_dir=snapshot_dir)
+    assert mlb_starters.list_snapshots(snapshot_dir) == fetch_times[-2:]
+    assert os.listdir(os.path.join(snapshot_dir, 'days')) == [os.path.basename(fresh)]
+
+def test_snapshots_in_the_same_second(tmp_path, monkeypatch):
+    # Fetches a few microseconds apart each keep their own snapshot, alongside a name from before microseconds
+    snapshot_dir = str(tmp_path)
+    schedule = pd.DataFrame({'Game Date':['2024-05-01'], 'game_id':[75001], 'h_a':['home'], 'Pitcher Name':['Gerrit Cole'],
+                             'MLBAMID':[543037], 'Team':['NYY'], 'Opp':['BAL']})
+    fetch_times = [datetime.datetime(2024, 5, 1, 12), datetime.datetime(2024, 5, 1, 12, 0, 0, 5),
+                   datetime.datetime(2024, 5, 1, 12, 0, 0, 999999)]
+    schedule.to_parquet(os.path.join(snapshot_dir, 'schedule_20240501T120000.parquet'), index=False)
+    for fetch_time, pitcher in zip(fetch_times[1:], ['Nestor Cortes', 'Carlos Rodon']):
+        schedule.assign(**{'Pitcher Name':pitcher}).to_parquet(mlb_starters.snapshot_path(fetch_time, snapshot_dir), index=False)
+    assert mlb_starters.snapshot_path(fetch_times[0], snapshot_dir) == os.path.join(snapshot_dir, 'schedule_20240501T120000.parquet')
+    assert mlb_starters.list_snapshots(snapshot_dir) == fetch_times
+    assert [mlb_starters.load_snapshot(fetch_time, snapshot_dir)['Pitcher Name'][0] for fetch_time in fetch_times] == \
+        ['Gerrit Cole', 'Nestor Cortes', 'Carlos Rodon']
+    assert len(mlb_starters.latest_changes(snapshot_dir)['swapped']) == 1
+
+@pytest.fixture
+def players_db(tmp_path, monkeypatch):
+    # SQLite stand-in for the players table, with a snapshot path in tmp, and a count of full table reads
+    db_path = str(tmp_path/'players.db')
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('CREATE TABLE players (sportradar_player_id TEXT, mlb_player_id INTEGER, batting_hand TEXT, full_name TEXT, updated_at TEXT)')
+        conn.execute("INSERT INTO players VALUES ('sr-cole', 543037, 'R', 'Gerrit Cole', '2024-05-01')")
+    monkeypatch.setenv('PL_DB_SQLITE', db_path)
+    monkeypatch.setattr(mlb_starters, 'PLAYER_MAP_SNAPSHOT', str(tmp_path/'player_maps.pkl'))
+    monkeypatch.setattr(mlb_starters, 'PLAYER_MAP_WATERMARK', None)
+    monkeypatch.setattr(mlb_starters, 'player_maps_cache', {})
+    reads = []
+    query_player_maps = mlb_starters.query_player_maps
+    monkeypatch.setattr(mlb_starters, 'query_player_maps', lambda conn: reads.append(1) or query_player_maps(conn))
+    return db_path, reads
+
+def rename_player(db_path, name, updated_at=None):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('UPDATE players SET full_name = ?, updated_at = coalesce(?, updated_at)', (name, updated_at))
+
+def load_in_new_process():
+    # Drop the in-memory maps, as a fresh process would have none
+    mlb_starters.player_maps_cache.clear()
+    return mlb_starters.player_maps()
+
+def test_fresh_snapshot_is_reused(players_db, monkeypatch):
+    db_path, reads = players_db
+    monkeypatch.setattr(mlb_starters, 'PLAYER_MAP_TTL', 3600)
+    assert load_in_new_process()['name_map'] == {'sr-cole':'Gerrit Cole'}
+    rename_player(db_path, 'G. Cole')
+    assert load_in_new_process()['name_map'] == {'sr-cole':'Gerrit Cole'}
+    assert len(reads) == 1
+
+def test_expired_snapshot_is_reloaded(players_db, monkeypatch):
+    db_path, reads = players_db
+    monkeypatch.setattr(mlb_starters, 'PLAYER_MAP_TTL', 0)
+    load_in_new_process()
+    rename_player(db_path, 'G. Cole')
+    assert load_in_new_process()['name_map'] == {'sr-cole':'G. Cole'}
+    assert len(reads) == 2
+
+def test_watermark_decides_refresh(players_db, monkeypatch):
+    db_path, reads = players_db
+    monkeypatch.setattr(mlb_starters, 'PLAYER_MAP_TTL', 0)
+    monkeypatch.setattr(mlb_starters, 'PLAYER_MAP_WATERMARK', 'updated_at')
+    load_in_new_process()
+    # Expired, but the watermark hasn't moved: the snapshot is kept
+    rename_player(db_path, 'G. Cole')
+    assert load_in_new_process()['name_map'] == {'sr-cole':'Gerrit Cole'}
+    assert len(reads) == 1
+    rename_player(db_path, 'Gerrit A. Cole', updated_at='2024-05-02')
+    assert load_in_new_process()['name_map'] == {'sr-cole':'Gerrit A. Cole'}
+    assert len(reads) == 2
+
+def test_watermark_column_must_be_allowed(players_db, monkeypatch):
+    monkeypatch.setattr(mlb_starters, 'PLAYER_MAP_TTL', 0)
+    monkeypatch.setattr(mlb_starters, 'PLAYER_MAP_WATERMARK', 'updated_at) FROM players; DROP TABLE players; --')
+    with pytest.raises(ValueError):
+        load_in_new_process()
@@ -0,0 +1,78 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+import run_expectancy as re
+
+def play_game(game_pk, rng, innings=9, walk_off=False):
+    # Pitch-by-pitch Statcast-like rows for one game: every PA is two pitches, ending in a single or an out
+    rows = []
+    score = {'Top':0, 'Bot':0}
+    at_bat = 0
+    for inning in range(1, innings+1):
+        for half in ['Top', 'Bot']:
+            outs, bases = 0, [None, None, None]
+            fld = 'Bot' if half=='Top' else 'Top'
+            while outs < 3:
+                at_bat += 1
+                event = 'single' if rng.random() < 0.35 else 'field_out'
+                runs = int(event=='single' and bases[2] is not None)
+                if walk_off and inning==innings and half=='Bot' and event=='single':
+                    runs = max(runs, score['Top'] - score['Bot'] + 1)
+                for pitch_number, pitch_event in [(1, None), (2, event)]:
+                    rows.append({'game_pk':game_pk, 'game_year':2023, 'inning':inning, 'inning_topbot':half,
+                                 'at_bat_number':at_bat, 'pitch_number':pitch_number, 'outs_when_up':outs,
+                                 'on_1b':bases[0], 'on_2b':bases[1], 'on_3b':bases[2],
+                                 'balls':pitch_number-1, 'strikes':0, 'bat_score':score[half],
+                                 'post_bat_score':score[half] + (runs if pitch_event else 0), 'fld_score':score[fld],
+                                 'events':pitch_event})
+                score[half] += runs
+                if event=='single':
+                    bases = [1, bases[0], bases[1]]
+                else:
+                    outs += 1
+                if score['Bot'] > score['Top'] and walk_off and inning==innings and half=='Bot':
+                    return pd.DataFrame(rows)
+    return pd.DataFrame(rows)
+
+def assert_same_sums(a, b):
+    assert sorted(a)==sorted(b)
+    for year in a:
+        for key in ['pa', 'inning_runs', 'pa_runs_to_end', 'pitches', 'runs_to_end']:
+            np.testing.assert_allclose(a[year][key], b[year][key])
+        for key in ['transitions', 'runs_on_play']:
+            assert sorted(a[year][key])==sorted(b[year][key])
+            for event in a[year][key]:
+                np.testing.assert_allclose(a[year][key][event], b[year][key][event])
+
+def test_add_sums_empty():
+    assert re.add_sums({}, play_game(1, np.random.default_rng(0)).iloc[:0])=={}
+
+def test_unfinished_games():
+    rng = np.random.default_rng(0)
+    finished = play_game(1, rng)
+    walk_off = play_game(2, rng, walk_off=True)
+    suspended = play_game(3, rng)
+    suspended = suspended.loc[suspended.index < suspended.index[(suspended['inning']==5) & (suspended['inning_topbot']=='Top')][2]]
+    assert list(re.unfinished_games(pd.concat([finished, walk_off, suspended]))) == [3]
+
+def test_stream_sums_joins_games_suspended_for_weeks():
+    # Game 3 is suspended mid-inning on day 2 and resumed on day 20, three chunks later
+    rng = np.random.default_rng(1)
+    games = []
+    for game_pk in range(1, 40):
+        game = play_game(game_pk, rng).assign(game_date=datetime.date(2023, 4, 1) + datetime.timedelta(days=game_pk % 25))
+        games.append(game)
+    suspended = play_game(100, rng)
+    # Split right after the first PA of a half-inning that scores later on, so a split would change the sums
+    halves = suspended.groupby(['inning','inning_topbot'], sort=False)
+    scoring = (halves['post_bat_score'].transform('max') > suspended['bat_score']) & suspended['events'].notna()
+    split = scoring.idxmax() + 1
+    suspended['game_date'] = np.where(suspended.index < split, datetime.date(2023, 4, 2), datetime.date(2023, 4, 20))
+    pitches = pd.concat(games+[suspended], ignore_index=True)
+
+    pull = lambda start_dt, end_dt: pitches.loc[(pitches['game_date'] >= pd.Timestamp(start_dt).date()) &
+                                                (pitches['game_date'] <= pd.Timestamp(end_dt).date())]
+    streamed = re.stream_sums(datetime.date(2023, 4, 1), datetime.date(2023, 4, 30), chunk_days=7, pull=pull)
+    assert_same_sums(streamed, re.add_sums({}, pitches[re.pitch_columns]))
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+import stability_test as st
+
+def synthetic_pools(n_players=300, seed=0):
+    # Binary events for player-years of varying length, each with its own true rate
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(50, 600, n_players)
+    rates = rng.beta(20, 20, n_players)
+    values = np.concatenate([(rng.random(length) < rate).astype('float64') for length, rate in zip(lengths, rates)])
+    stops = np.cumsum(lengths)
+    return values, stops-lengths, stops
+
+def test_bootstrap_band_brackets_point_estimate():
+    values, starts, stops = synthetic_pools()
+    for samplesize in [100, 300]:
+        estimates = [st.alpha_array(st.sample_events(values, starts, stops, samplesize, np.random.default_rng(i))) for i in range(100)]
+        alphas = st.bootstrap_alphas(values, starts, stops, samplesize, 200, np.random.default_rng(1), max_cells=2**20)
+        lo, hi = np.percentile(alphas, [5, 95])
+        assert lo < np.mean(estimates) < hi
+
+def test_bootstrap_draws_without_replacement(monkeypatch):
+    # Every event is distinct, so a replicate drawn without replacement never repeats a value within a player-year
+    starts, stops = np.array([0, 20, 45]), np.array([20, 45, 80])
+    values = np.arange(80, dtype='float64')
+    replicates = []
+    alpha_array = st.alpha_array
+    monkeypatch.setattr(st, 'alpha_array', lambda prepped: replicates.append(prepped) or alpha_array(prepped))
+    st.bootstrap_alphas(values, starts, stops, 20, 10, np.random.default_rng(0))
+    for replicate in np.concatenate(replicates):
+        for player in replicate.T:
+            assert len(np.unique(player)) == 20
+
+def test_bootstrap_resamples_player_years_with_replacement(monkeypatch):
+    # Every event is distinct, so a player-year's column is recognisable by its values; replicates repeat some
+    # player-years and leave others out, while each column still holds samplesize of one player-year's events
+    lengths = np.full(40, 10)
+    stops = np.cumsum(lengths)
+    starts = stops-lengths
+    values = np.arange(stops[-1], dtype='float64')
+    replicates = []
+    alpha_array = st.alpha_array
+    monkeypatch.setattr(st, 'alpha_array', lambda prepped: replicates.append(prepped) or alpha_array(prepped))
+    st.bootstrap_alphas(values, starts, stops, 5, 20, np.random.default_rng(0))
+    repeated = 0
+    for replicate in np.concatenate(replicates):
+        players = replicate[0] // 10
+        assert (replicate // 10 == players).all()
+        repeated += len(np.unique(players)) < len(players)
+    assert repeated == 20
+
+def test_calculate_with_repeated_extradenom(tmp_path):
+    # An extradenom equal to an increment is only run (and written) once
+    values, starts, stops = synthetic_pools(n_players=30)
+    data = pd.DataFrame({'player': np.repeat(np.arange(len(starts)), stops-starts), 'year': 2024, 'stat': values})
+    path = str(tmp_path/'run')
+    st.calculate(['stat'], data, 'player', 'year', 'PA', [2024], 'hitters', path, 200, 50, extradenom=[50], seed=0)
+    alphas = pd.read_csv(path+'_alpha.csv')
+    assert list(alphas['PA']) == [50, 100, 150]
+
+def test_calculate_same_curves_for_any_worker_count(tmp_path):
+    values, starts, stops = synthetic_pools(n_players=30)
+    data = pd.DataFrame({'player': np.repeat(np.arange(len(starts)), stops-starts), 'year': 2024, 'stat': values})
+    tables = []
+    for workers in [0, 1, 2]:
+        path = str(tmp_path/f'run_{workers}')
+        st.calculate(['stat'], data, 'player', 'year', 'PA', [2024], 'hitters', path, 300, 50, seed=7, workers=workers)
+        tables.append(pd.read_csv(path+'_alpha.csv'))
+    pd.testing.assert_frame_equal(tables[0], tables[1])
+    pd.testing.assert_frame_equal(tables[0], tables[2])
+
+def test_calculate_same_bands_for_any_worker_count(tmp_path):
+    # Bootstrap replicates run inside the (stat, sample size) tasks, on each cell's own seed stream
+    values, starts, stops = synthetic_pools(n_players=30)
+    data = pd.DataFrame({'player': np.repeat(np.arange(len(starts)), stops-starts), 'year': 2024, 'stat': values})
+    tables = []
+    for workers in [0, 2]:
+        path = str(tmp_path/f'run_{workers}')
+        st.calculate(['stat'], data, 'player', 'year', 'PA', [2024], 'hitters', path, 200, 50, seed=7, workers=workers, bootstrap=50)
+        tables.append((pd.read_csv(path+'_alpha_lo.csv'), pd.read_csv(path+'_alpha_hi.csv')))
+    for first, second in zip(*tables):
+        pd.testing.assert_frame_equal(first, second)
+    assert (tables[0][0]['stat'] < tables[0][1]['stat']).all()
+
+def pools_by_key(keys, values, starts, stops):
+    return {key: values[:, start:stop] for key, start, stop in zip(keys, starts, stops)}
+
+def test_stream_player_pools_match_player_pools(tmp_path):
+    # Streaming a CSV (in small chunks) or a year-partitioned Parquet dataset gives the same player-year pools,
+    # with years outside the range, a year with no events, and missing values
+    rng = np.random.default_rng(0)
+    n = 3000
+    data = pd.DataFrame({'player': rng.choice(['a', 'b', 'c', 'd', 'e'], n), 'year': rng.choice([2021, 2022, 2024], n),
+                         'hit': rng.random(n).round(3), 'walk': np.where(rng.random(n) < 0.1, np.nan, rng.random(n).round(3))})
+    yearrange = [2022, 2023, 2024]
+    expected = pools_by_key(*st.player_pools(data, ['hit', 'walk'], 'player', 'year', yearrange))
+    data.to_csv(tmp_path/'events.csv', index=False)
+    st.partition_by_year(data, str(tmp_path/'events'), 'year')
+    for source in [str(tmp_path/'events.csv'), str(tmp_path/'events')]:
+        keys, values, starts, stops = st.stream_player_pools(source, ['hit', 'walk'], 'player', 'year', yearrange, chunksize=500)
+        assert values.shape == (2, (data['year'].isin(yearrange)).sum())
+        streamed = pools_by_key(keys, values, starts, stops)
+        assert streamed.keys() == expected.keys()
+        for key in expected:
+            np.testing.assert_array_equal(streamed[key], expected[key])
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+import stadium_geometry as sg
+
+# Statcast hit coordinates are about 2.33 ft per unit from home plate at (125.42, 198.27)
+def batted_balls(distance, angle):
+    angle = np.radians(angle)
+    return (125.42 + distance/2.33*np.sin(angle), 198.27 - distance/2.33*np.cos(angle))
+
+def test_spray_coordinates_match_pybaseball_outline_transform():
+    # pybaseball draws outline point p at (p - center)*scale + center, over balls at (hc_x, hc_y)
+    x, y = sg.spray_coordinates(np.array([125 + 2.495/2.33*10]), np.array([199 - 2.495/2.33*20]))
+    np.testing.assert_allclose([x[0], y[0]], [135, 179])
+
+@pytest.mark.parametrize('team', sg.stadium_teams())
+def test_classify_batted_balls(team):
+    hc_x, hc_y = zip(*[batted_balls(60, 0),     # Ground ball back up the middle
+                       batted_balls(300, 0),    # Fly ball to center
+                       batted_balls(550, 0),    # Over the center field fence anywhere
+                       batted_balls(250, -30),  # Left-center gap
+                       batted_balls(200, -60),  # Foul down the left field side
+                       batted_balls(200, 60),   # Foul down the right field side
+                       batted_balls(40, 180)])  # Behind home plate
+    x, y = sg.spray_coordinates(np.array(hc_x), np.array(hc_y))
+    result = sg.classify_batted_balls(x, y, team)
+    assert result['fair'].tolist() == [True, True, True, True, False, False, False]
+    assert result['infield'].tolist()[:4] == [True, False, False, False]
+    assert result['outfield'].tolist() == [False, True, False, True, False, False, False]
+    assert result['cleared'].tolist() == [False, False, True, False, False, False, False]
@@ -0,0 +1,93 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+import statcast_warehouse as wh
+
+def fake_statcast(game_days, calls):
+    # Stand-in for pybaseball's statcast: three pitches for each game day in the range, and a record of every call
+    def pull(start_dt, end_dt):
+        calls.append((start_dt, end_dt))
+        days = [day for day in game_days if start_dt <= day <= end_dt]
+        return pd.DataFrame({'game_date':np.repeat(days, 3),
+                             'game_pk':np.repeat(np.arange(len(days)), 3),
+                             'game_year':[int(day[:4]) for day in np.repeat(days, 3)],
+                             'pitch_number':np.tile([1, 2, 3], len(days)),
+                             'plate_x':np.tile([0.83, -0.2, 0.1], len(days)),
+                             'unused_column':'x'})
+    return pull
+
+def test_missing_runs():
+    stored = {'2023-04-03', '2023-04-04'}
+    runs = wh.missing_runs(datetime.date(2023, 4, 1), datetime.date(2023, 4, 12), stored, chunk_days=3)
+    assert runs == [(datetime.date(2023, 4, 1), datetime.date(2023, 4, 2)),
+                    (datetime.date(2023, 4, 5), datetime.date(2023, 4, 7)),
+                    (datetime.date(2023, 4, 8), datetime.date(2023, 4, 10)),
+                    (datetime.date(2023, 4, 11), datetime.date(2023, 4, 12))]
+
+def test_update_warehouse_is_incremental(tmp_path):
+    root = str(tmp_path)
+    calls = []
+    pull = fake_statcast(['2023-04-01', '2023-04-02', '2023-04-04'], calls)
+    wh.update_warehouse('2023-04-01', '2023-04-05', root=root, chunk_days=7, pull=pull)
+    assert calls == [('2023-04-01', '2023-04-05')]
+    # 04-03 is an off day between pulled days; 04-05 is after the last day with pitches, so it isn't settled yet
+    assert wh.stored_days(root) == {'2023-04-01', '2023-04-02', '2023-04-03', '2023-04-04'}
+
+    calls.clear()
+    wh.update_warehouse('2023-04-01', '2023-04-05', root=root, chunk_days=7, pull=pull)
+    assert calls == [('2023-04-05', '2023-04-05')]
+
+def test_empty_pull_is_not_recorded(tmp_path):
+    root = str(tmp_path)
+    calls = []
+    wh.update_warehouse('2023-04-01', '2023-04-03', root=root, pull=fake_statcast([], calls))
+    assert wh.stored_days(root) == set()
+    # The days come back on the next run
+    wh.update_warehouse('2023-04-01', '2023-04-03', root=root, pull=fake_statcast(['2023-04-02'], calls))
+    assert calls == [('2023-04-01', '2023-04-03')]*2
+    assert wh.stored_days(root) == {'2023-04-01', '2023-04-02'}
+
+def test_query_pitches_prunes_partitions(tmp_path):
+    root = str(tmp_path)
+    days = ['2022-09-30', '2023-04-01', '2023-04-02', '2023-04-03']
+    wh.update_warehouse('2022-09-30', '2023-04-03', root=root, chunk_days=400, pull=fake_statcast(days, []))
+    # An unreadable file in a partition the queries don't ask for; opening it would fail
+    with open(tmp_path/'season=2023'/'day=2023-04-03'/'corrupt.parquet', 'wb') as f:
+        f.write(b'not parquet')
+
+    by_date = wh.query_pitches(['game_pk', 'plate_x'], start_date='2023-04-01', end_date='2023-04-02', root=root)
+    assert list(by_date.columns) == ['game_pk', 'plate_x']
+    assert len(by_date) == 6
+
+    by_season = wh.query_pitches(['game_date'], seasons=[2022], root=root)
+    assert set(by_season['game_date'].dt.strftime('%Y-%m-%d')) == {'2022-09-30'}
+
+def test_locations_are_stored_exactly(tmp_path):
+    root = str(tmp_path)
+    wh.update_warehouse('2023-04-01', '2023-04-01', root=root, pull=fake_statcast(['2023-04-01'], []))
+    plate_x = wh.query_pitches(['plate_x'], root=root)['plate_x']
+    assert plate_x.dtype == 'float64'
+    assert (plate_x == 0.83).sum() == 1
+
+def test_recent_partial_day_is_topped_up(tmp_path):
+    # Yesterday's pitches are only partly published on the first update; the next update replaces them with the full day
+    root = str(tmp_path)
+    yesterday = (datetime.date.today() - datetime.timedelta(days=1)).strftime('%Y-%m-%d')
+    calls = []
+    full_day = fake_statcast([yesterday], calls)
+    wh.update_warehouse(yesterday, root=root, pull=lambda start_dt, end_dt: full_day(start_dt, end_dt).iloc[:1])
+    assert len(wh.query_pitches(['pitch_number'], root=root)) == 1
+
+    wh.update_warehouse(yesterday, root=root, pull=full_day)
+    assert sorted(wh.query_pitches(['pitch_number'], root=root)['pitch_number']) == [1, 2, 3]
+    assert calls == [(yesterday, yesterday)]*2
+
+def test_settled_days_are_not_pulled_again(tmp_path):
+    root = str(tmp_path)
+    day = (datetime.date.today() - datetime.timedelta(days=wh.SETTLE_DAYS+1)).strftime('%Y-%m-%d')
+    calls = []
+    wh.update_warehouse(day, day, root=root, pull=fake_statcast([day], calls))
+    wh.update_warehouse(day, day, root=root, pull=fake_statcast([day], calls))
+    assert calls == [(day, day)]
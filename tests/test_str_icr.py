@@ -0,0 +1,59 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import str_icr
+
+NOTEBOOK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'str_icr_notebook.ipynb')
+cascade_cells = ("db_data['cleaned_description']", "db_data['strike'] = 0", "db_data[['launch_speed'",
+                 "db_data['icr'] = 0", "db_data.loc[db_data['icr']==1")
+
+def notebook_cascade(db_data):
+    # The notebook's own .loc cascade, run cell for cell from str_icr_notebook.ipynb
+    with open(NOTEBOOK) as f:
+        cells = [''.join(cell['source']) for cell in json.load(f)['cells'] if cell['cell_type']=='code']
+    namespace = {'db_data':db_data.copy(), 'pd':pd, 'np':np}
+    for cell in cells:
+        if cell.startswith(cascade_cells):
+            exec(cell, namespace)
+    return namespace['db_data']
+
+def labelled_frame():
+    # Half-unit grid, which lands exactly on every integer threshold and most of the linear region edges,
+    # plus points exactly on the 2.4/1.3/1.55-weighted edges, missing launch values, and every description
+    speeds, angles = np.meshgrid(np.arange(50, 130.5, 0.5), np.arange(-40, 80.5, 0.5))
+    speeds, angles = list(speeds.ravel()), list(angles.ravel())
+    for la in [0, 5, 10, 15, 20, 25, 30]:
+        speeds += [98 - la*2.4, 112 - la*1.3, 92 - la*1.55, 89 - la*1.3]
+        angles += [la]*4
+    speeds += [np.nan, 100, np.nan, 75]
+    angles += [20, np.nan, np.nan, 15]
+    descriptions = list(str_icr.description_map) + ['Something Unmapped', None]
+    return pd.DataFrame({'pitch_description':[descriptions[i % len(descriptions)] for i in range(len(speeds))],
+                         'launch_speed':speeds, 'launch_angle':angles})
+
+def test_icr_labels_match_notebook():
+    df = labelled_frame()
+    expected = notebook_cascade(df)
+    labels = str_icr.icr_labels(df['launch_speed'], df['launch_angle'])
+    np.testing.assert_array_equal(labels, expected['icr'].to_numpy())
+    assert labels.sum() > 0 and (labels==0).sum() > 0
+    assert (labels[df['launch_speed'].isna().to_numpy() | df['launch_angle'].isna().to_numpy()]==0).all()
+
+def test_str_icr_columns_match_notebook():
+    df = labelled_frame()
+    expected = notebook_cascade(df)
+    result = str_icr.str_icr_columns(df.copy())
+    for column in ['cleaned_description', 'strike', 'icr', 'str-icr', 'wstr-icr', 'icr/str']:
+        pd.testing.assert_series_equal(result[column], expected[column], check_dtype=False)
+    # Balls and unmapped descriptions without a hard-hit ball aren't strikes
+    non_contact = result['cleaned_description'].isin(['ball', 'hit_by_pitch', 'Something Unmapped']) & (result['icr']==0)
+    assert non_contact.any() and (result.loc[non_contact, 'strike']==0).all()
+
+def test_label_chunks_match_single_frame():
+    df = labelled_frame()
+    whole = str_icr.str_icr_columns(df.copy())
+    chunked = pd.concat(str_icr.label_chunks(df.iloc[i:i+5000].copy() for i in range(0, len(df), 5000)))
+    pd.testing.assert_frame_equal(chunked, whole)
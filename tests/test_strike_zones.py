@@ -0,0 +1,58 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import strike_zones
+
+NOTEBOOK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Strikezone_Heatmap.ipynb')
+zone_cells = ('def zone_framework():', 'def prep_zone_locations(')
+
+def notebook_functions():
+    # zone_framework & prep_zone_locations as written in Strikezone_Heatmap.ipynb
+    with open(NOTEBOOK) as f:
+        cells = [''.join(cell['source']) for cell in json.load(f)['cells'] if cell['cell_type']=='code']
+    namespace = {'pd':pd, 'np':np}
+    for cell in cells:
+        if cell.startswith(zone_cells):
+            # DataFrame.append was removed in pandas 2; build the same row with concat
+            row_append = "zone_df.append({'h_zone':int(x),'v_zone':int(y)}, ignore_index=True)"
+            cell = cell.replace(row_append, "pd.concat([zone_df, pd.DataFrame([{'h_zone':int(x),'v_zone':int(y)}])], ignore_index=True)")
+            exec(cell, namespace)
+    return namespace['zone_framework'], namespace['prep_zone_locations']
+
+def located_frame(sz_top=3.45, sz_bot=1.62):
+    # Every horizontal edge and every batter-specific vertical edge, each exactly and nudged either side,
+    # crossed so each of the 100 grid cells (and so zones 1-9 & 11-14) is hit, plus missing locations
+    zone_height = sz_top - sz_bot
+    h_edges = [-10/12, -15/24, -5/12, -5/24, 0, 5/24, 5/12, 15/24, 10/12]
+    v_edges = [sz_bot - zone_height/6, sz_bot, zone_height/6 + sz_bot, zone_height/3 + sz_bot, sz_top - zone_height/2,
+               sz_top - zone_height/3, sz_top - zone_height/6, sz_top, sz_top + zone_height/6]
+    xs = sorted({x + nudge for x in h_edges for nudge in [-1e-3, 0, 1e-3]} | {-2.0, 2.0})
+    zs = sorted({z + nudge for z in v_edges for nudge in [-1e-3, 0, 1e-3]} | {0.0, 5.0})
+    plate_x, plate_z = [grid.ravel() for grid in np.meshgrid(xs, zs)]
+    df = pd.DataFrame({'plate_x':plate_x, 'plate_z':plate_z, 'sz_top':sz_top, 'sz_bot':sz_bot})
+    missing = pd.DataFrame({'plate_x':[np.nan, 0.3, np.nan, 0.3], 'plate_z':[2.5, np.nan, np.nan, 2.5],
+                            'sz_top':sz_top, 'sz_bot':[sz_bot, sz_bot, sz_bot, np.nan]})
+    return pd.concat([df, missing], ignore_index=True)
+
+def test_zone_framework_matches_notebook():
+    notebook_zone_framework, _ = notebook_functions()
+    expected = notebook_zone_framework()
+    result = strike_zones.zone_framework()
+    assert list(result['h_zone']) == list(expected['h_zone'].astype(int))
+    assert list(result['v_zone']) == list(expected['v_zone'].astype(int))
+    assert list(result['statcast_zone']) == list(expected['statcast_zone'].astype(int))
+
+def test_prep_zone_locations_matches_notebook():
+    _, notebook_prep_zone_locations = notebook_functions()
+    for sz_top, sz_bot in [(3.45, 1.62), (3.5, 1.5), (3.21, 1.47)]:
+        df = located_frame(sz_top, sz_bot)
+        df['row'] = range(len(df))
+        # The notebook merges onto the framework, which reorders rows; line them back up by row
+        expected = notebook_prep_zone_locations(df.copy(), 'plate_x', 'plate_z').sort_values('row')
+        result = strike_zones.prep_zone_locations(df.copy(), 'plate_x', 'plate_z')
+        for column in ['h_zone', 'v_zone', 'statcast_zone']:
+            np.testing.assert_array_equal(result[column].to_numpy(), expected[column].to_numpy().astype(int), err_msg=column)
+        assert set(result['statcast_zone']) == set(range(1, 10)) | set(range(11, 15))
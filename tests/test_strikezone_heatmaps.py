@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('matplotlib')
+pytest.importorskip('seaborn')
+import matplotlib
+
+from strike_zones import prep_zone_locations, zone_framework
+import strikezone_heatmaps
+
+def pitches(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'batter_name':rng.choice(['Aaron Judge', 'Juan Soto', 'Mookie Betts'], n),
+                       'pitch_name':rng.choice(['4-Seam Fastball', 'Slider', 'Changeup'], n),
+                       'plate_x':rng.normal(0, 0.9, n).round(2), 'plate_z':rng.normal(2.5, 0.9, n).round(2),
+                       'sz_top':rng.normal(3.4, 0.1, n).round(2), 'sz_bot':rng.normal(1.6, 0.1, n).round(2),
+                       'zone':rng.integers(1, 15, n), 'delta_run_exp':rng.normal(0, 0.1, n)})
+    return prep_zone_locations(df, 'plate_x', 'plate_z')
+
+def notebook_grid(df, player_name, target_stat, pitch=''):
+    # The heatmap_df pivot from the notebook's strikezone_heatmap (rows v_zone, columns h_zone)
+    heatmap_data = df.loc[df['pitch_name'].isin(pitch)] if pitch!='' else df
+    heatmap_df = (heatmap_data.loc[heatmap_data['batter_name']==player_name]
+                  .groupby('statcast_zone', as_index=False)[target_stat].mean()
+                  .merge(zone_framework(), how='right', on='statcast_zone'))
+    return heatmap_df.pivot(index='v_zone', columns='h_zone', values=target_stat)
+
+def test_zone_means_match_notebook_pivot():
+    df = pitches()
+    batters, pitch_labels, grids, counts = strikezone_heatmaps.zone_means(df, 'delta_run_exp')
+    for b, batter in enumerate(batters):
+        for p, pitch in enumerate(pitch_labels):
+            expected = notebook_grid(df, batter, 'delta_run_exp', '' if pitch=='All' else [pitch])
+            assert list(expected.index) == strikezone_heatmaps.zone_labels
+            assert list(expected.columns) == strikezone_heatmaps.zone_labels
+            np.testing.assert_allclose(grids[b, p], expected.to_numpy())
+    assert pitch_labels[-1] == 'All'
+    assert (counts[:, -1] == df.groupby('batter_name').size().reindex(batters).to_numpy()).all()
+
+def test_grid_orientation():
+    # One pitch high & outside to the right (h_zone 5, v_zone 5) lands in the last row & column only
+    df = pd.DataFrame({'batter_name':['Juan Soto'], 'pitch_name':['Slider'], 'plate_x':[1.5], 'plate_z':[4.5],
+                       'sz_top':[3.5], 'sz_bot':[1.5], 'zone':[12], 'delta_run_exp':[1.0]})
+    df = prep_zone_locations(df, 'plate_x', 'plate_z')
+    grid = strikezone_heatmaps.zone_means(df, 'delta_run_exp')[2][0, 0]
+    filled = ~np.isnan(grid)
+    assert filled[9, 9] and filled[:, :5].sum() == 0 and filled[:5, :].sum() == 0
+    np.testing.assert_array_equal(filled, ~np.isnan(notebook_grid(df, 'Juan Soto', 'delta_run_exp').to_numpy()))
+
+def test_color_scale_matches_notebook():
+    df = pitches()
+    colorscale_df = df.loc[df['zone'].isin(range(1,10))].groupby(['batter_name','zone'])['delta_run_exp'].mean()
+    vmin, vmax = strikezone_heatmaps.color_scale(df, 'delta_run_exp')
+    assert vmax == pytest.approx(colorscale_df.quantile(0.9)) and vmin == -vmax
+
+def test_import_leaves_backend_alone():
+    import importlib
+    matplotlib.use('pdf')
+    importlib.reload(strikezone_heatmaps)
+    assert matplotlib.get_backend() == 'pdf'